@@ -0,0 +1,138 @@
+"""Equivalence check and benchmark of the fused voice post-processing.
+
+Runs ``audio_post``'s fused chain and a step-by-step reference (one array per
+step, then ``soundfile``) on synthetic speech-like signals, fails with exit
+status 1 when any output differs byte for byte, and then times both and
+reports their peak allocations. Run with ``uv run python bench_audio_post.py``
+after touching ``audio_post.py``; it does not need torch or the Silero model.
+"""
+import io
+import logging
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import resample_poly
+
+from audio_post import (
+    FADE_MS,
+    PAUSE_MS_BETWEEN_CHUNKS,
+    PCM16_SCALE,
+    SILENCE_PEAK,
+    SOFT_LIMIT,
+    TARGET_PEAK,
+    assemble,
+    encode_wav,
+    process_in_place,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _reference_fade_in_out(audio, sample_rate, fade_ms=FADE_MS):
+    n = audio.shape[0]
+    k = int(sample_rate * fade_ms / 1000.0)
+    if audio.size == 0 or k <= 1 or n < 2 * k:
+        return audio
+    window = np.linspace(0.0, 1.0, k, dtype=np.float32)
+    faded = audio.copy()
+    faded[:k] *= window
+    faded[-k:] *= window[::-1]
+    return faded
+
+
+def _reference_peak_normalize(audio, peak=TARGET_PEAK):
+    if audio.size == 0:
+        return audio
+    max_abs = float(np.max(np.abs(audio)))
+    if max_abs <= SILENCE_PEAK:
+        return audio
+    return audio * (peak / max_abs)
+
+
+def _reference_soft_limit(audio, limit=SOFT_LIMIT):
+    if audio.size == 0 or float(np.max(np.abs(audio))) <= limit:
+        return audio
+    return np.tanh(np.clip(audio, -1.0, 1.0) / limit) * limit
+
+
+def _reference_postprocess(audio, sample_rate, target_sample_rate):
+    processed = audio if audio.size == 0 else audio - np.mean(audio, dtype=np.float32)
+    processed = _reference_fade_in_out(processed, sample_rate)
+    processed = _reference_peak_normalize(processed)
+    processed = _reference_soft_limit(processed)
+    if sample_rate != target_sample_rate:
+        gcd = int(np.gcd(sample_rate, target_sample_rate))
+        processed = resample_poly(processed, target_sample_rate // gcd, sample_rate // gcd)
+    return np.asarray(processed, dtype=np.float32)
+
+
+def _reference(parts, pause_samples, sample_rate, target_sample_rate):
+    silence = np.zeros(pause_samples, dtype=np.float32)
+    all_parts = []
+    for idx, part in enumerate(parts):
+        all_parts.append(part)
+        if idx < len(parts) - 1 and pause_samples > 0:
+            all_parts.append(silence)
+    raw_audio = np.concatenate(all_parts).astype(np.float32, copy=False)
+    processed = _reference_postprocess(raw_audio, sample_rate, target_sample_rate)
+    wav_i16 = (np.clip(processed, -1.0, 1.0) * PCM16_SCALE).astype(np.int16)
+    buffer = io.BytesIO()
+    sf.write(buffer, wav_i16, target_sample_rate, format="WAV", subtype="PCM_16")
+    return buffer.getvalue()
+
+
+def _fused(parts, pause_samples, sample_rate, target_sample_rate):
+    audio, peak = process_in_place(assemble(parts, pause_samples), sample_rate, target_sample_rate)
+    return encode_wav(audio, target_sample_rate, peak).getvalue()
+
+
+def main() -> int:
+    """Check the fused chain against the reference one and time both; returns the exit status."""
+    rng = np.random.default_rng(0)
+    rate = 48000
+    pause = int(rate * PAUSE_MS_BETWEEN_CHUNKS / 1000.0)
+    cases = {
+        "speech": ([(rng.standard_normal(rate * 4) * 0.3 + 0.02).astype(np.float32) for _ in range(3)], rate, rate),
+        "quiet": ([(rng.standard_normal(rate) * 1e-4).astype(np.float32)], rate, rate),
+        "silence": ([np.zeros(rate, dtype=np.float32)], rate, rate),
+        "short": ([rng.standard_normal(100).astype(np.float32)], rate, rate),
+        "resampled": ([rng.standard_normal(24000 * 3).astype(np.float32) * 0.5], 24000, rate),
+    }
+    mismatched = []
+    for name, (parts, sample_rate, target_rate) in cases.items():
+        expected = _reference(parts, pause, sample_rate, target_rate)
+        actual = _fused(parts, pause, sample_rate, target_rate)
+        if expected != actual:
+            mismatched.append(name)
+            logger.error(f"{name}: fused output differs from the reference ({len(actual)} vs {len(expected)} bytes)")
+        else:
+            logger.info(f"{name}: identical ({len(actual)} bytes)")
+    if mismatched:
+        logger.error(f"Fused post-processing does not match the reference for: {', '.join(mismatched)}")
+        return 1
+
+    parts, sample_rate, target_rate = cases["speech"]
+    for label, run in (
+        ("reference", lambda: _reference(parts, pause, sample_rate, target_rate)),
+        ("fused", lambda: _fused(parts, pause, sample_rate, target_rate)),
+    ):
+        run()
+        repeats = 50
+        started = time.perf_counter()
+        for _ in range(repeats):
+            run()
+        elapsed = (time.perf_counter() - started) / repeats
+        tracemalloc.start()
+        run()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        logger.info(f"{label}: {elapsed * 1000:.2f} ms per utterance, peak allocations {peak_bytes / 1e6:.2f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.exit(main())
@@ -0,0 +1,248 @@
+"""Runtime-independent bot state shared by ``swear.py`` and ``swear_async.py``.
+
+Conversations, prompts, active modes, tracked bot messages, the reminder
+phrases and the TTS factory live here. Importing this module has no side
+effects: the tracked message history is loaded and its flusher started by
+``open_message_history``, and TTS is built by ``create_tts``, so each runtime
+decides which background components it runs.
+"""
+import atexit
+import logging
+import random
+import re
+import threading
+import time
+from pathlib import Path
+
+from config import Config
+from message_store import ChatMessageIndex, HistoryFlusher, create_message_history_store
+from topic_extractor import TopicExtractor
+
+logger = logging.getLogger(__name__)
+
+STACK_SIZE = 16
+
+#SWEAR_PROMPT = Config.SWEAR_PROMPT # "Обзови Алису. Пол: Женский. Возраст: 20 лет."
+
+SWEAR_PERIOD = (90,180)
+VOICE_PROBABILITY = 0.3
+REMINDER_PERIOD = (90*60, 180*60)
+#REMINDER_PERIOD = (2, 4)
+TALK_PERIOD = (15*60,240*60)
+NEWS_PERIOD = (180*60,360*60)
+#NEWS_PERIOD = (2,10)
+SAMPLE_RATE = 48000
+BOT_MESSAGE_HISTORY_FILE = Path(__file__).with_name("bot_message_history.json")
+BOT_MESSAGE_JOURNAL_FILE = Path(__file__).with_name("bot_message_history.journal")
+BOT_MESSAGE_RETENTION_SECONDS = 48 * 60 * 60
+CLEANUP_STATUS_TTL_SECONDS = 10
+MAX_TRACKED_MESSAGES_PER_CHAT = 5000
+TELEGRAM_DELETE_MESSAGES_LIMIT = 100
+
+REMINDER_SENTENCES = ["_Вертится_ __что-то__ на **языке**...", "**Эх**х....", "~Поругаемся~ может?", "Ну *что*?"]
+
+chats_conversations = {}
+# Keyword topics of the same conversations, so news mode rarely needs the topic LLM call
+topic_extractor = TopicExtractor(STACK_SIZE, Config.TOPIC_MIN_CONFIDENCE)
+# Словарь для хранения промптов для каждого чата
+chat_prompts = {}
+# Словарь для хранения активного режима каждого чата
+chat_active_modes = {}
+
+# Filled by open_message_history(); the store keeps a reference to the same dict
+bot_message_history_lock = threading.Lock()
+bot_message_history = {}
+bot_message_store = None
+bot_message_flusher = None
+
+
+def escape_markdown_v2(text):
+    # Characters that need escaping
+    special_chars = r'_[]()~`>#+=|{}.!-'  # Added '-' to the list
+
+    def escape_char(c):
+        return '\\' + c if c in special_chars else c
+
+    def handle_formatting(text):
+        # Handle bold (asterisks)
+        text = re.sub(r'\*\*(.+?)\*\*', r'*\1*', text)  # Replace ** with *
+        text = re.sub(r'(?<!\\)\*(.+?)(?<!\\)\*', r'*\1*', text)  # Keep single * as is
+
+        # Handle italic (underscores)
+        text = re.sub(r'(?<!\\)_(.+?)(?<!\\)_', r'*\1*', text)  # Replace _ with *
+
+        return text
+
+    # First, handle formatting (bold and italic)
+    text = handle_formatting(text)
+
+    # Then escape special characters, preserving existing escapes
+    result = []
+    i = 0
+    while i < len(text):
+        if text[i] == '\\' and i + 1 < len(text) and text[i+1] in f"{special_chars}*":
+            result.append(text[i:i+2])  # Keep existing escapes
+            i += 2
+        elif text[i] == '*':
+            result.append('*')  # Keep * for formatting
+            i += 1
+        elif text[i] in special_chars:
+            result.append('\\' + text[i])  # Escape special chars
+            i += 1
+        else:
+            result.append(text[i])  # Regular character
+            i += 1
+
+    return ''.join(result)
+
+def roll_voice():
+    return random.random() < VOICE_PROBABILITY
+
+def get_random_voice(voices):
+    return voices[random.randint(0, len(voices)-1)]
+
+def reminder_generator(sender):
+    return REMINDER_SENTENCES[random.randint(0, len(REMINDER_SENTENCES)-1)]
+
+def add_conversation(conversations, conversation, chat_id=None):
+    conversations.append(conversation)
+    if chat_id is not None:
+        topic_extractor.add(chat_id, conversation)
+    if len(conversations) > STACK_SIZE:
+        conversations.pop(0)
+    logger.info(conversations)
+
+def voice_prewarm_phrases():
+    phrases = list(REMINDER_SENTENCES)
+    if Config.VOICE_CACHE_PREWARM_PATH:
+        try:
+            with open(Config.VOICE_CACHE_PREWARM_PATH, encoding='utf-8') as f:
+                phrases.extend(line.strip() for line in f if line.strip())
+        except OSError as e:
+            logger.warning(f"Unable to read voice prewarm phrases: {e}")
+    return phrases
+
+def create_tts(sample_rate=SAMPLE_RATE):
+    """Silero TTS for the current configuration; returns ``(tts, voice_cache)``."""
+    # Imported per branch, so that neither importing this module nor running TTS in worker processes loads torch
+    if Config.TTS_PROCESSES > 0:
+        from tts_service import TTSWorkerPool
+
+        # Silero runs in worker processes, each with its own voice cache memory tier
+        tts = TTSWorkerPool(Config.TTS_PROCESSES, sample_rate)
+        atexit.register(tts.close)
+        return tts, None
+    from tts_gen import TTSGenerator
+    from voice_cache import VoiceCache
+
+    # Swears and fixed phrases repeat a lot; their synthesized audio is reused across chats and restarts
+    voice_cache = VoiceCache(
+        Config.VOICE_CACHE_SIZE, Config.VOICE_CACHE_DIR, int(Config.VOICE_CACHE_MAX_MB * 1024 * 1024)
+    )
+    tts = TTSGenerator(
+        sample_rate,
+        cache=voice_cache,
+        # With a single TTS thread no other synthesis can join the batch, so waiting is pure latency
+        batch_window_ms=Config.TTS_BATCH_WINDOW_MS if Config.TTS_WORKERS > 1 else 0,
+        batch_max_chunks=Config.TTS_BATCH_MAX_CHUNKS,
+        num_threads=Config.TTS_TORCH_THREADS,
+    )
+    return tts, voice_cache
+
+def _normalize_tracked_messages(raw_messages):
+    now = time.time()
+    normalized = []
+    if not isinstance(raw_messages, list):
+        return normalized
+
+    for item in raw_messages:
+        if isinstance(item, dict):
+            message_id = item.get("message_id")
+            sent_at = item.get("sent_at", now)
+        else:
+            message_id = item
+            sent_at = now
+
+        if not isinstance(message_id, int):
+            continue
+
+        try:
+            sent_at = float(sent_at)
+        except (TypeError, ValueError):
+            sent_at = now
+
+        if now - sent_at <= BOT_MESSAGE_RETENTION_SECONDS:
+            normalized.append({"message_id": message_id, "sent_at": sent_at})
+
+    return normalized[-MAX_TRACKED_MESSAGES_PER_CHAT:]
+
+def open_message_history():
+    """Load the tracked bot messages and start their background flusher (once)."""
+    global bot_message_store, bot_message_history, bot_message_flusher
+    if bot_message_flusher is not None:
+        return
+    bot_message_store = create_message_history_store(
+        Config.BOT_MESSAGE_STORE, BOT_MESSAGE_HISTORY_FILE, BOT_MESSAGE_JOURNAL_FILE
+    )
+    bot_message_history = bot_message_store.load(_normalize_tracked_messages)
+    bot_message_flusher = HistoryFlusher(
+        bot_message_store, bot_message_history_lock, Config.BOT_MESSAGE_FLUSH_INTERVAL_MS
+    ).start()
+    atexit.register(bot_message_flusher.stop)
+
+def _prune_tracked_messages(chat_id):
+    chat_key = str(chat_id)
+    messages = bot_message_history.get(chat_key)
+    if messages is None:
+        return
+    messages.expire(time.time() - BOT_MESSAGE_RETENTION_SECONDS, MAX_TRACKED_MESSAGES_PER_CHAT)
+    if not messages:
+        bot_message_history.pop(chat_key, None)
+
+def prune_tracked_messages(chat_id):
+    with bot_message_history_lock:
+        _prune_tracked_messages(chat_id)
+
+def track_bot_message(message):
+    if message is None:
+        return message
+
+    chat = getattr(message, "chat", None)
+    chat_id = getattr(chat, "id", None)
+    message_id = getattr(message, "message_id", None)
+    if chat_id is None or message_id is None:
+        return message
+
+    with bot_message_history_lock:
+        chat_key = str(chat_id)
+        sent_at = time.time()
+        messages = bot_message_history.get(chat_key)
+        if messages is None:
+            messages = bot_message_history[chat_key] = ChatMessageIndex()
+        messages.append(message_id, sent_at)
+        _prune_tracked_messages(chat_id)
+        bot_message_store.record_add(chat_key, message_id, sent_at)
+    bot_message_flusher.notify()
+
+    return message
+
+def forget_bot_message(chat_id, message_id):
+    forget_bot_messages(chat_id, [message_id])
+
+def forget_bot_messages(chat_id, message_ids):
+    message_ids = list(message_ids)
+    with bot_message_history_lock:
+        chat_key = str(chat_id)
+        messages = bot_message_history.get(chat_key)
+        if messages is not None:
+            messages.remove_many(message_ids)
+            if not messages:
+                bot_message_history.pop(chat_key, None)
+        bot_message_store.record_remove(chat_key, message_ids)
+    bot_message_flusher.notify()
+
+def tracked_message_ids(chat_id):
+    with bot_message_history_lock:
+        _prune_tracked_messages(chat_id)
+        messages = bot_message_history.get(str(chat_id))
+        return messages.message_ids() if messages is not None else []
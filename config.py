@@ -17,3 +17,61 @@ class Config:
     NEWSAPI_API_KEY = os.environ.get('NEWSAPI_API_KEY')
     SWEAR_PROMPT = os.environ.get('SWEAR_PROMPT')
     SILERO_LOCAL_PATH = os.environ.get('SILERO_LOCAL_PATH')
+    BOT_MESSAGE_STORE = os.environ.get('BOT_MESSAGE_STORE', 'journal')
+    BOT_MESSAGE_FLUSH_INTERVAL_MS = int(os.environ.get('BOT_MESSAGE_FLUSH_INTERVAL_MS', '500'))
+    TIMER_QUEUE_WORKERS = int(os.environ.get('TIMER_QUEUE_WORKERS', '4'))
+    SEND_WORKERS = int(os.environ.get('SEND_WORKERS', '8'))
+    TTS_WORKERS = int(os.environ.get('TTS_WORKERS', '1'))
+    TTS_PROCESSES = int(os.environ.get('TTS_PROCESSES', '0'))
+    TTS_TORCH_THREADS = int(os.environ.get('TTS_TORCH_THREADS', '4'))
+    TTS_BATCH_WINDOW_MS = float(os.environ.get('TTS_BATCH_WINDOW_MS', '20'))
+    TTS_BATCH_MAX_CHUNKS = int(os.environ.get('TTS_BATCH_MAX_CHUNKS', '16'))
+    TTS_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('TTS_REQUEST_TIMEOUT_SECONDS', '120'))
+    TELEGRAM_RUN_MODE = os.environ.get('TELEGRAM_RUN_MODE', 'polling').strip().lower()
+    TELEGRAM_WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL')
+    TELEGRAM_WEBHOOK_LISTEN = os.environ.get('TELEGRAM_WEBHOOK_LISTEN', '0.0.0.0')
+    TELEGRAM_WEBHOOK_PORT = int(os.environ.get('TELEGRAM_WEBHOOK_PORT', '8443'))
+    TELEGRAM_WEBHOOK_PATH = os.environ.get('TELEGRAM_WEBHOOK_PATH', '/telegram')
+    TELEGRAM_WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET')
+    WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', '4'))
+    WEBHOOK_QUEUE_SIZE = int(os.environ.get('WEBHOOK_QUEUE_SIZE', '256'))
+    TELEGRAM_GLOBAL_RATE = float(os.environ.get('TELEGRAM_GLOBAL_RATE', '30'))
+    TELEGRAM_CHAT_RATE = float(os.environ.get('TELEGRAM_CHAT_RATE', '1'))
+    TELEGRAM_CHAT_BURST = int(os.environ.get('TELEGRAM_CHAT_BURST', '3'))
+    TELEGRAM_MAX_RETRIES = int(os.environ.get('TELEGRAM_MAX_RETRIES', '3'))
+    OUTBOUND_WORKERS = int(os.environ.get('OUTBOUND_WORKERS', '8'))
+    SWEAR_PREFETCH_SIZE = int(os.environ.get('SWEAR_PREFETCH_SIZE', '5'))
+    SWEAR_PREFETCH_LOW_WATER = int(os.environ.get('SWEAR_PREFETCH_LOW_WATER', '2'))
+    SWEAR_BACKENDS = [name.strip().lower() for name in os.environ.get('SWEAR_BACKENDS', 'openai').split(',') if name.strip()]
+    HEDGE_MIN_DELAY_MS = int(os.environ.get('HEDGE_MIN_DELAY_MS', '300'))
+    HEDGE_MAX_DELAY_MS = int(os.environ.get('HEDGE_MAX_DELAY_MS', '5000'))
+    SEND_DEADLINE_FRACTION = float(os.environ.get('SEND_DEADLINE_FRACTION', '0.5'))
+    SEND_DEADLINE_MIN_SECONDS = float(os.environ.get('SEND_DEADLINE_MIN_SECONDS', '10'))
+    SEND_DEADLINE_MAX_SECONDS = float(os.environ.get('SEND_DEADLINE_MAX_SECONDS', '120'))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RESET_SECONDS = float(os.environ.get('CIRCUIT_RESET_SECONDS', '30'))
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '20'))
+    HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+    HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '30'))
+    OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL') or None
+    LLM_TIMEOUT = float(os.environ.get('LLM_TIMEOUT', '60'))
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', '2'))
+    LLM_CACHE_SIZE = int(os.environ.get('LLM_CACHE_SIZE', '1024'))
+    LLM_CACHE_TTL_SECONDS = float(os.environ.get('LLM_CACHE_TTL_SECONDS', '3600'))
+    LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH')
+    NEWSAPI_BASE_URL = os.environ.get('NEWSAPI_BASE_URL', 'https://newsapi.org/v2').rstrip('/')
+    NEWSAPI_DAILY_BUDGET = int(os.environ.get('NEWSAPI_DAILY_BUDGET', '100'))
+    NEWS_CACHE_TTL_SECONDS = float(os.environ.get('NEWS_CACHE_TTL_SECONDS', '1800'))
+    NEWS_CACHE_STALE_SECONDS = float(os.environ.get('NEWS_CACHE_STALE_SECONDS', '21600'))
+    NEWS_PROMPT_TOKEN_BUDGET = int(os.environ.get('NEWS_PROMPT_TOKEN_BUDGET', '600'))
+    PIPELINE_WORKERS = int(os.environ.get('PIPELINE_WORKERS', '8'))
+    TOPIC_MIN_CONFIDENCE = float(os.environ.get('TOPIC_MIN_CONFIDENCE', '0.2'))
+    TALK_CACHE_POLICY = os.environ.get('TALK_CACHE_POLICY', 'unchanged').strip().lower()
+    TALK_CACHE_MAX_AGE_SECONDS = float(os.environ.get('TALK_CACHE_MAX_AGE_SECONDS', '14400'))
+    TALK_STREAMING = os.environ.get('TALK_STREAMING', '0').strip().lower() not in ('0', 'false', 'no', 'off')
+    STREAM_EDIT_INTERVAL_MS = int(os.environ.get('STREAM_EDIT_INTERVAL_MS', '1000'))
+    VOICE_CACHE_SIZE = int(os.environ.get('VOICE_CACHE_SIZE', '128'))
+    VOICE_CACHE_DIR = os.environ.get('VOICE_CACHE_DIR')
+    VOICE_CACHE_MAX_MB = float(os.environ.get('VOICE_CACHE_MAX_MB', '200'))
+    VOICE_CACHE_PREWARM = os.environ.get('VOICE_CACHE_PREWARM', '0').strip().lower() not in ('0', 'false', 'no', 'off')
+    VOICE_CACHE_PREWARM_PATH = os.environ.get('VOICE_CACHE_PREWARM_PATH')
@@ -1,6 +1,8 @@
 
-from openai import OpenAI
 from config import Config
+from http_clients import for_deadline, get_async_openai_client, get_openai_client
+from llm_cache import POLICY_OFF, POLICY_UNCHANGED, make_key, response_cache
+from resilience import breaker, remaining_timeout
 
 SYSTEM_PROMPT = """
 You are a thoughtful and polite conversationalist. 
@@ -12,23 +14,72 @@ Try to add references to philosophers and works of fiction.
 Answer in Russian.
 """
 
+MODEL = "gpt-4.1-mini"
+
 class Colocutor():
 	def __init__(self):
-		self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+		self.client = get_openai_client()
+		self.async_client = get_async_openai_client()
 		return
 	
-	def get_answer(self, questions):
+	def _build_request(self, questions):
 		messages=[
 		    {"role": "system", "content": SYSTEM_PROMPT},
 		]
 		messages.extend(
 			{"role": "user", "content": question} for question in questions
 		)
-		response = self.client.chat.completions.create(
-		    model = "gpt-4.1-mini",
+		return dict(
+		    model = MODEL,
 		    #model = "gpt-4o",
 		    messages=messages,
 		    temperature = 0.4,
-		    max_tokens = 200
+		    max_tokens = 200,
+		    timeout = remaining_timeout(Config.LLM_TIMEOUT)
 		)
+
+	def _complete(self, questions):
+		response = breaker("openai").call(for_deadline(self.client).chat.completions.create, **self._build_request(questions))
+		return response.choices[0].message.content 
+
+	async def _acomplete(self, questions):
+		response = await breaker("openai").acall(for_deadline(self.async_client).chat.completions.create, **self._build_request(questions))
 		return response.choices[0].message.content 
+
+	def already_answered(self, questions):
+		"""True when the ``unchanged`` policy holds a reply to this exact window: nobody spoke since the last one."""
+		return (Config.TALK_CACHE_POLICY == POLICY_UNCHANGED
+			and response_cache.get(make_key(MODEL, SYSTEM_PROMPT, questions)) is not None)
+
+	# A quiet chat asks again with the same window; with the default TALK_CACHE_POLICY
+	# the reply is skipped (None) instead of posting the previous one again
+	def get_answer(self, questions):
+		if self.already_answered(questions):
+			return None
+		key = make_key(MODEL, SYSTEM_PROMPT, questions)
+		return response_cache.get_or_compute(key, lambda: self._complete(questions), Config.TALK_CACHE_POLICY)
+
+	async def aget_answer(self, questions):
+		if self.already_answered(questions):
+			return None
+		key = make_key(MODEL, SYSTEM_PROMPT, questions)
+		return await response_cache.aget_or_compute(key, lambda: self._acomplete(questions), Config.TALK_CACHE_POLICY)
+
+	def stream_answer(self, questions):
+		"""Yield the reply in chunks as the model produces them; a cached reply comes as one chunk."""
+		key = make_key(MODEL, SYSTEM_PROMPT, questions)
+		if Config.TALK_CACHE_POLICY != POLICY_OFF:
+			cached = response_cache.get(key)
+			if cached is not None:
+				yield cached
+				return
+		chunks = []
+		stream = breaker("openai").call(for_deadline(self.client).chat.completions.create, stream=True, **self._build_request(questions))
+		for event in stream:
+			if not event.choices:
+				continue
+			delta = event.choices[0].delta.content
+			if delta:
+				chunks.append(delta)
+				yield delta
+		response_cache.put(key, "".join(chunks) or None, Config.TALK_CACHE_POLICY)
@@ -0,0 +1,156 @@
+"""Process-wide HTTP and LLM clients.
+
+Every generator used to build its own client (or a bare ``requests`` call),
+so each module, and sometimes each call, paid for a fresh connection pool and
+TLS handshake. The getters below create one client per kind on first use and
+hand the same instance out afterwards, so keep-alive connections are reused
+across generators and threads. Pool sizes and timeouts come from ``Config``.
+"""
+import logging
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from resilience import deadline_active, remaining_timeout
+
+logger = logging.getLogger(__name__)
+
+_clients = {}
+# Reentrant: factories of LLM clients fetch their shared HTTP client through _get
+_lock = threading.RLock()
+
+
+def _get(key, factory):
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = factory()
+                logger.info(f"Created shared client {key}")
+    return client
+
+
+def http_timeout():
+    """``(connect, read)`` timeout for ``requests`` calls, shortened to the current deadline."""
+    return (Config.HTTP_CONNECT_TIMEOUT, remaining_timeout(Config.HTTP_READ_TIMEOUT))
+
+
+def _httpx_limits():
+    return httpx.Limits(
+        max_connections=Config.HTTP_POOL_SIZE,
+        max_keepalive_connections=Config.HTTP_POOL_SIZE,
+    )
+
+
+def _httpx_timeout(read):
+    return httpx.Timeout(read, connect=Config.HTTP_CONNECT_TIMEOUT)
+
+
+def _make_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=Config.HTTP_POOL_SIZE, pool_maxsize=Config.HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Shared ``requests`` session for plain REST APIs (NewsAPI, GigaChat)."""
+    return _get("requests", _make_session)
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Shared ``httpx.AsyncClient`` for the asyncio runtime."""
+    return _get("httpx-async", lambda: httpx.AsyncClient(
+        limits=_httpx_limits(), timeout=_httpx_timeout(Config.HTTP_READ_TIMEOUT)))
+
+
+def _llm_http_client():
+    return _get("httpx-llm", lambda: httpx.Client(
+        limits=_httpx_limits(), timeout=_httpx_timeout(Config.LLM_TIMEOUT)))
+
+
+def _llm_async_http_client():
+    return _get("httpx-llm-async", lambda: httpx.AsyncClient(
+        limits=_httpx_limits(), timeout=_httpx_timeout(Config.LLM_TIMEOUT)))
+
+
+def get_openai_client():
+    from openai import OpenAI
+
+    return _get("openai", lambda: OpenAI(
+        api_key=Config.OPENAI_API_KEY,
+        base_url=Config.OPENAI_BASE_URL,
+        http_client=_llm_http_client(),
+        timeout=Config.LLM_TIMEOUT,
+        max_retries=Config.LLM_MAX_RETRIES,
+    ))
+
+
+def get_async_openai_client():
+    from openai import AsyncOpenAI
+
+    return _get("openai-async", lambda: AsyncOpenAI(
+        api_key=Config.OPENAI_API_KEY,
+        base_url=Config.OPENAI_BASE_URL,
+        http_client=_llm_async_http_client(),
+        timeout=Config.LLM_TIMEOUT,
+        max_retries=Config.LLM_MAX_RETRIES,
+    ))
+
+
+def _make_chat_llm(model, temperature, max_retries):
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        api_key=Config.OPENAI_API_KEY,
+        base_url=Config.OPENAI_BASE_URL,
+        model=model,
+        temperature=temperature,
+        timeout=Config.LLM_TIMEOUT,
+        max_retries=max_retries,
+        http_client=_llm_http_client(),
+        http_async_client=_llm_async_http_client(),
+    )
+
+
+def get_chat_llm(model, temperature):
+    """Shared LangChain ``ChatOpenAI`` per (model, temperature), on the pooled HTTP clients."""
+    return _get(("chat-llm", model, temperature), lambda: _make_chat_llm(model, temperature, Config.LLM_MAX_RETRIES))
+
+
+def _without_retries(client):
+    # OpenAI clients copy themselves; a ChatOpenAI is rebuilt on the same HTTP clients
+    if hasattr(client, "with_options"):
+        return client.with_options(max_retries=0)
+    return _make_chat_llm(client.model_name, client.temperature, 0)
+
+
+def for_deadline(client):
+    """The shared LLM ``client``, or its copy without SDK retries while a deadline is set.
+
+    A call capped by ``remaining_timeout`` would otherwise be retried with
+    the same timeout and could run for several times the time left.
+    """
+    if not deadline_active() or not Config.LLM_MAX_RETRIES:
+        return client
+    return _get(("no-retries", id(client)), lambda: _without_retries(client))
+
+
+def close_all():
+    """Close the sync clients created so far; async ones are closed with their event loop."""
+    with _lock:
+        clients = list(_clients.items())
+        _clients.clear()
+    for key, client in clients:
+        close = getattr(client, "close", None)
+        if close is None or "async" in str(key):
+            continue
+        try:
+            close()
+        except Exception as e:
+            logger.warning(f"Failed to close shared client {key}: {e}")
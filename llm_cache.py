@@ -0,0 +1,161 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 60 * 60
+DEFAULT_UNCHANGED_MAX_AGE_SECONDS = 4 * 60 * 60
+
+# Entries expire after the cache TTL.
+POLICY_TTL = "ttl"
+# A changed conversation simply produces a new key, so the old answer is
+# reused only while the input stays the same, and at most for the cache's
+# ``unchanged_max_age``. The talk mode uses a hit to skip the send, so a
+# quiet chat does not get the same reply again.
+POLICY_UNCHANGED = "unchanged"
+# Bypass the cache.
+POLICY_OFF = "off"
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, dict):
+        return {str(key): _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def make_key(model, template, inputs) -> str:
+    """Cache key for one LLM call: model, prompt template and whitespace-normalized input."""
+    payload = json.dumps([model, template, _normalize(inputs)], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Size-bounded LRU of LLM answers with a TTL and optional JSON persistence.
+
+    Expiry uses wall-clock time so entries survive a restart when ``path`` is
+    set; ``load`` reads the file and ``save`` rewrites it atomically. An entry
+    stored with ``POLICY_UNCHANGED`` expires after ``unchanged_max_age``
+    instead of the TTL.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, path=None,
+                 unchanged_max_age=DEFAULT_UNCHANGED_MAX_AGE_SECONDS):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = ttl_seconds
+        self.unchanged_max_age = unchanged_max_age
+        self.path = Path(path) if path else None
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Cached value for ``key``, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, policy=POLICY_TTL) -> None:
+        if policy == POLICY_OFF or value is None:
+            return
+        lifetime = self.unchanged_max_age if policy == POLICY_UNCHANGED else self.ttl_seconds
+        expires_at = time.time() + lifetime
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key, compute, policy=POLICY_TTL):
+        """Return the cached value or store and return ``compute()``."""
+        if policy == POLICY_OFF:
+            return compute()
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value, policy)
+        return value
+
+    async def aget_or_compute(self, key, compute, policy=POLICY_TTL):
+        """Coroutine flavour of ``get_or_compute``; ``compute`` returns an awaitable."""
+        if policy == POLICY_OFF:
+            return await compute()
+        value = self.get(key)
+        if value is None:
+            value = await compute()
+            self.put(key, value, policy)
+        return value
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def load(self) -> "ResponseCache":
+        if not self.path or not self.path.exists():
+            return self
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Unable to load LLM response cache: {e}")
+            return self
+
+        now = time.time()
+        with self._lock:
+            for key, expires_at, value in raw if isinstance(raw, list) else []:
+                if expires_at is None:
+                    # Saved before unchanged answers had a max age
+                    expires_at = now + self.unchanged_max_age
+                if expires_at > now:
+                    self._entries[key] = (expires_at, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        logger.info(f"Loaded {len(self._entries)} cached LLM answers from {self.path}")
+        return self
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            payload = [[key, expires_at, value] for key, (expires_at, value) in self._entries.items()]
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            tmp_path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Unable to save LLM response cache: {e}")
+
+
+response_cache = ResponseCache(
+    Config.LLM_CACHE_SIZE,
+    Config.LLM_CACHE_TTL_SECONDS,
+    Config.LLM_CACHE_PATH,
+    unchanged_max_age=Config.TALK_CACHE_MAX_AGE_SECONDS,
+).load()
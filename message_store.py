@@ -0,0 +1,425 @@
+import abc
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_COMPACT_EVERY = 5000
+DEFAULT_FLUSH_INTERVAL_MS = 500
+INDEX_COMPACT_MIN_SLOTS = 64
+
+
+def _write_text_atomic(path: Path, text: str) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        handle.write(text)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def _encode_json(payload) -> str:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def _read_json_snapshot(path: Path) -> dict:
+    if not path.exists():
+        return {}
+
+    try:
+        raw_history = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Unable to load bot message history: {e}")
+        return {}
+
+    if not isinstance(raw_history, dict):
+        return {}
+    return raw_history
+
+
+class ChatMessageIndex:
+    """Tracked message ids of one chat, ordered by ``sent_at``.
+
+    Ids and timestamps live in two parallel arrays with a moving head; an
+    id -> slot map makes removal by id O(1) by leaving a dead slot behind.
+    Dead slots are skipped when the head advances, and the arrays are rebuilt
+    once more than half of them is dead, so append, expiry from the head and
+    removal are all O(1) amortized.
+    """
+
+    __slots__ = ("_ids", "_sent_at", "_head", "_slots")
+
+    def __init__(self):
+        self._ids = array("q")
+        self._sent_at = array("d")
+        self._head = 0
+        self._slots: dict[int, int] = {}
+
+    @classmethod
+    def from_entries(cls, entries) -> "ChatMessageIndex":
+        index = cls()
+        for item in sorted(entries, key=lambda item: item["sent_at"]):
+            index.append(item["message_id"], item["sent_at"])
+        return index
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __bool__(self) -> bool:
+        return bool(self._slots)
+
+    def _is_live(self, slot: int) -> bool:
+        return self._slots.get(self._ids[slot]) == slot
+
+    def append(self, message_id: int, sent_at: float) -> None:
+        self._slots[message_id] = len(self._ids)
+        self._ids.append(message_id)
+        self._sent_at.append(sent_at)
+
+    def remove(self, message_id: int) -> bool:
+        if self._slots.pop(message_id, None) is None:
+            return False
+        self._maybe_compact()
+        return True
+
+    def remove_many(self, message_ids) -> int:
+        removed = sum(1 for message_id in message_ids if self._slots.pop(message_id, None) is not None)
+        if removed:
+            self._maybe_compact()
+        return removed
+
+    def expire(self, cutoff: float, max_size: int | None = None) -> None:
+        """Drop entries sent before ``cutoff`` and the oldest ones beyond ``max_size``."""
+        ids, sent_at, slots = self._ids, self._sent_at, self._slots
+        head = self._head
+        while head < len(ids):
+            if not self._is_live(head):
+                head += 1
+            elif sent_at[head] < cutoff or (max_size is not None and len(slots) > max_size):
+                del slots[ids[head]]
+                head += 1
+            else:
+                break
+        self._head = head
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        total = len(self._ids)
+        if total < INDEX_COMPACT_MIN_SLOTS or len(self._slots) * 2 > total:
+            return
+
+        ids = array("q")
+        sent_at = array("d")
+        slots = {}
+        for slot in range(self._head, total):
+            if self._is_live(slot):
+                slots[self._ids[slot]] = len(ids)
+                ids.append(self._ids[slot])
+                sent_at.append(self._sent_at[slot])
+        self._ids, self._sent_at, self._head, self._slots = ids, sent_at, 0, slots
+
+    def message_ids(self) -> list[int]:
+        return [self._ids[slot] for slot in range(self._head, len(self._ids)) if self._is_live(slot)]
+
+    def to_list(self) -> list[dict]:
+        return [
+            {"message_id": self._ids[slot], "sent_at": self._sent_at[slot]}
+            for slot in range(self._head, len(self._ids))
+            if self._is_live(slot)
+        ]
+
+    def copy(self) -> "ChatMessageIndex":
+        clone = ChatMessageIndex()
+        clone._ids = self._ids[self._head:]
+        clone._sent_at = self._sent_at[self._head:]
+        clone._slots = {message_id: slot - self._head for message_id, slot in self._slots.items()}
+        return clone
+
+
+class MessageHistoryStore(abc.ABC):
+    """Keeps the tracked bot message history in memory and persists changes.
+
+    Callers mutate ``history`` (chat key -> ``ChatMessageIndex``) while holding
+    their own lock and report each change through ``record_add``/``record_remove``.
+    Those calls only buffer; ``flush`` takes the
+    same lock briefly to collect pending work and then writes outside of it.
+    Expiry is not recorded: expired entries are dropped again by ``normalize``
+    on load.
+    """
+
+    def __init__(self):
+        self.history: dict[str, ChatMessageIndex] = {}
+        self._write_lock = threading.Lock()
+
+    @abc.abstractmethod
+    def load(self, normalize: Callable[[object], list[dict]]) -> dict[str, ChatMessageIndex]:
+        ...
+
+    @abc.abstractmethod
+    def record_add(self, chat_key: str, message_id: int, sent_at: float) -> None:
+        ...
+
+    @abc.abstractmethod
+    def record_remove(self, chat_key: str, message_ids) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _drain(self, force: bool):
+        """Collect pending work while the history lock is held. Returns None if clean."""
+        ...
+
+    @abc.abstractmethod
+    def _write(self, pending) -> None:
+        ...
+
+    def flush(self, history_lock, force: bool = False) -> None:
+        with self._write_lock:
+            with history_lock:
+                pending = self._drain(force)
+            if pending is not None:
+                self._write(pending)
+
+    def close(self, history_lock) -> None:
+        self.flush(history_lock, force=True)
+
+    def _normalize_raw(self, raw_history: dict, normalize) -> dict[str, ChatMessageIndex]:
+        # Legacy formats are validated once here; the indexes trust their input afterwards.
+        history = {}
+        for chat_id, messages in raw_history.items():
+            normalized = normalize(messages)
+            if normalized:
+                history[str(chat_id)] = ChatMessageIndex.from_entries(normalized)
+        return history
+
+
+class JsonMessageHistoryStore(MessageHistoryStore):
+    """Legacy format: the whole history as one JSON document.
+
+    Each chat's list is kept pre-encoded, so a flush only re-encodes the chats
+    that changed since the previous one and then rewrites the file atomically.
+    """
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = Path(path)
+        self._encoded: dict[str, str] = {}
+        self._dirty_chats: set[str] = set()
+
+    def load(self, normalize):
+        self.history = self._normalize_raw(_read_json_snapshot(self.path), normalize)
+        self._encoded = {}
+        self._dirty_chats = set(self.history)
+        return self.history
+
+    def record_add(self, chat_key, message_id, sent_at):
+        self._dirty_chats.add(chat_key)
+
+    def record_remove(self, chat_key, message_ids):
+        self._dirty_chats.add(chat_key)
+
+    def _drain(self, force):
+        if not self._dirty_chats and not force:
+            return None
+
+        for chat_key in self._dirty_chats:
+            messages = self.history.get(chat_key)
+            if messages:
+                self._encoded[chat_key] = _encode_json(messages.to_list())
+            else:
+                self._encoded.pop(chat_key, None)
+        self._dirty_chats = set()
+
+        # Chats can also disappear through expiry, which is not recorded.
+        for chat_key in [key for key in self._encoded if key not in self.history]:
+            del self._encoded[chat_key]
+
+        parts = (f"{_encode_json(chat_key)}:{encoded}" for chat_key, encoded in self._encoded.items())
+        return "{" + ",".join(parts) + "}"
+
+    def _write(self, pending):
+        try:
+            _write_text_atomic(self.path, pending)
+        except OSError as e:
+            logger.error(f"Unable to save bot message history: {e}")
+
+
+class JournalMessageHistoryStore(MessageHistoryStore):
+    """Append-only journal on top of a JSON snapshot.
+
+    Every change becomes one short journal line; a flush appends all buffered
+    lines with a single write. After ``compact_every`` journal entries the
+    history is written to the snapshot and the journal is truncated. On load
+    the snapshot is read, the journal replayed on top of it and the result
+    compacted right away.
+    """
+
+    def __init__(self, snapshot_path: Path, journal_path: Path, compact_every: int = JOURNAL_COMPACT_EVERY):
+        super().__init__()
+        self.snapshot_path = Path(snapshot_path)
+        self.journal_path = Path(journal_path)
+        self.compact_every = max(1, int(compact_every))
+        self._journal = None
+        self._journal_entries = 0
+        self._pending: list[str] = []
+
+    def load(self, normalize):
+        raw_history = _read_json_snapshot(self.snapshot_path)
+        replayed = self._replay_journal(raw_history)
+        self.history = self._normalize_raw(raw_history, normalize)
+        if replayed:
+            logger.info(f"Replayed {replayed} bot message journal entries")
+        self._write(([], self._snapshot()))
+        return self.history
+
+    def _replay_journal(self, raw_history: dict) -> int:
+        if not self.journal_path.exists():
+            return 0
+
+        replayed = 0
+        try:
+            with open(self.journal_path, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn last line after a crash; everything before it is valid.
+                        logger.warning("Skipping corrupt bot message journal entry")
+                        continue
+                    if self._apply_entry(raw_history, entry):
+                        replayed += 1
+        except OSError as e:
+            logger.warning(f"Unable to read bot message journal: {e}")
+        return replayed
+
+    @staticmethod
+    def _apply_entry(raw_history: dict, entry) -> bool:
+        if not isinstance(entry, dict):
+            return False
+
+        chat_key = str(entry.get("chat"))
+        op = entry.get("op")
+        if op == "add":
+            messages = raw_history.setdefault(chat_key, [])
+            if not isinstance(messages, list):
+                messages = raw_history[chat_key] = []
+            messages.append({"message_id": entry.get("id"), "sent_at": entry.get("at")})
+            return True
+        if op == "del":
+            message_ids = set(entry.get("ids") or [])
+            messages = raw_history.get(chat_key)
+            if isinstance(messages, list):
+                raw_history[chat_key] = [
+                    item for item in messages
+                    if (item.get("message_id") if isinstance(item, dict) else item) not in message_ids
+                ]
+            return True
+        return False
+
+    def record_add(self, chat_key, message_id, sent_at):
+        self._pending.append(_encode_json({"op": "add", "chat": chat_key, "id": message_id, "at": sent_at}))
+
+    def record_remove(self, chat_key, message_ids):
+        self._pending.append(_encode_json({"op": "del", "chat": chat_key, "ids": list(message_ids)}))
+
+    def _snapshot(self) -> dict[str, ChatMessageIndex]:
+        # Array copies are cheap enough to take under the history lock; encoding happens in _write.
+        return {chat_key: messages.copy() for chat_key, messages in self.history.items()}
+
+    def _drain(self, force):
+        if not self._pending and not force:
+            return None
+
+        lines, self._pending = self._pending, []
+        if force or self._journal_entries + len(lines) >= self.compact_every:
+            # The snapshot already contains every buffered change.
+            return [], self._snapshot()
+        return lines, None
+
+    def _write(self, pending):
+        lines, snapshot = pending
+        try:
+            if snapshot is not None:
+                payload = {chat_key: messages.to_list() for chat_key, messages in snapshot.items()}
+                _write_text_atomic(self.snapshot_path, _encode_json(payload))
+                if self._journal is not None:
+                    self._journal.close()
+                self._journal = open(self.journal_path, "w", encoding="utf-8")
+                self._journal_entries = 0
+                return
+
+            if self._journal is None:
+                self._journal = open(self.journal_path, "a", encoding="utf-8")
+            self._journal.write("\n".join(lines) + "\n")
+            self._journal.flush()
+            self._journal_entries += len(lines)
+        except OSError as e:
+            logger.error(f"Unable to write bot message journal: {e}")
+
+    def close(self, history_lock):
+        super().close(history_lock)
+        with self._write_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+class HistoryFlusher:
+    """Background writer that persists a store at most once per ``interval_ms``.
+
+    ``notify`` is cheap and safe to call on the send path; any number of changes
+    made within one interval end up in a single write.
+    """
+
+    def __init__(self, store: MessageHistoryStore, history_lock, interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS):
+        self.store = store
+        self.history_lock = history_lock
+        self.interval = max(0, int(interval_ms)) / 1000.0
+        self._dirty = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="history-flusher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def notify(self):
+        self._dirty.set()
+
+    def _run(self):
+        last_flush = 0.0
+        while not self._stopping:
+            self._dirty.wait()
+            if self._stopping:
+                break
+            delay = last_flush + self.interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._dirty.clear()
+            try:
+                self.store.flush(self.history_lock)
+            except Exception as e:
+                logger.error(f"Unexpected error while flushing bot message history: {e}")
+            last_flush = time.monotonic()
+
+    def stop(self):
+        """Stop the writer thread and force a final flush."""
+        self._stopping = True
+        self._dirty.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self.store.close(self.history_lock)
+
+
+def create_message_history_store(kind: str, snapshot_path: Path, journal_path: Path) -> MessageHistoryStore:
+    kind = (kind or "journal").strip().lower()
+    if kind == "json":
+        return JsonMessageHistoryStore(snapshot_path)
+    if kind == "journal":
+        return JournalMessageHistoryStore(snapshot_path, journal_path)
+    raise ValueError(f"Unknown bot message store '{kind}'. Expected 'journal' or 'json'.")
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from topic_extractor import STOPWORDS, stem
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 30 * 60
+DEFAULT_STALE_SECONDS = 6 * 60 * 60
+DEFAULT_BUDGET = 100
+DEFAULT_BUDGET_WINDOW_SECONDS = 24 * 60 * 60
+EMPTY_NEWS = {"status": "ok", "totalResults": 0, "articles": []}
+
+# The extractor's Russian stopwords, plus short function words its length filter drops anyway
+_STOPWORDS = {word for word in STOPWORDS if re.match(r"[а-яё]", word)} | {
+    "a", "an", "the", "of", "in", "on", "for", "and", "to", "news", "latest",
+    "в", "во", "на", "о", "об", "от", "к", "ко", "с", "со", "у", "и", "а", "но", "из", "за", "по", "до",
+    "новости", "новость", "последние",
+}
+
+
+def _lemma(word):
+    # Cheap English plural folding: policies -> policy, taxes -> tax, markets -> market
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def normalize_topic(topic) -> str:
+    """Cache key of a topic: case, quotes, punctuation, stopwords and inflections folded, words sorted.
+
+    Russian words (topics of ``TopicExtractor``) use its stemming, English ones
+    a plural folding.
+    """
+    words = re.findall(r"\w+", str(topic).lower().replace("ё", "е"))
+    words = sorted({_lemma(stem(word)) for word in words if word not in _STOPWORDS})
+    return " ".join(words) or str(topic).strip().lower()
+
+
+class _Entry:
+    __slots__ = ("news", "fetched_at", "refreshing")
+
+    def __init__(self, news, fetched_at):
+        self.news = news
+        self.fetched_at = fetched_at
+        self.refreshing = False
+
+
+class NewsCache:
+    """Topic-keyed NewsAPI results with stale-while-revalidate.
+
+    A result younger than ``ttl`` is returned as is. An older one, up to
+    ``stale_ttl``, is still returned right away while a single background
+    refresh replaces it. Only a missing or fully expired topic waits for
+    NewsAPI. Every request counts against a sliding ``budget`` per
+    ``budget_window`` (the free NewsAPI plan allows 100 requests a day); once
+    it is spent, stale results are served, and topics never seen get an
+    empty article list. Error answers are never cached. Concurrent misses of
+    one topic share a single fetch: the first caller asks NewsAPI (and spends
+    the budget) while the others wait for its result. Results older than
+    ``stale_ttl`` are dropped once per ``ttl``, so topics asked once do not
+    stay forever.
+    """
+
+    def __init__(self, fetch, afetch=None, ttl=DEFAULT_TTL_SECONDS, stale_ttl=DEFAULT_STALE_SECONDS,
+                 budget=DEFAULT_BUDGET, budget_window=DEFAULT_BUDGET_WINDOW_SECONDS):
+        self.fetch = fetch
+        self.afetch = afetch
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.budget = budget
+        self.budget_window = budget_window
+        self._entries: dict[tuple, _Entry] = {}
+        self._inflight: dict[tuple, Future] = {}
+        self._requests = deque()
+        self._next_eviction = time.time() + self.ttl
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="news-refresh")
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _take_budget(self) -> bool:
+        # Caller holds the lock.
+        now = time.time()
+        while self._requests and self._requests[0] <= now - self.budget_window:
+            self._requests.popleft()
+        if len(self._requests) >= self.budget:
+            return False
+        self._requests.append(now)
+        return True
+
+    def _evict_expired(self, now):
+        # Caller holds the lock. A topic being fetched keeps its entry for the error fallback.
+        self._next_eviction = now + self.ttl
+        expired = [
+            key for key, entry in self._entries.items()
+            if now - entry.fetched_at >= self.stale_ttl and key not in self._inflight
+        ]
+        for key in expired:
+            del self._entries[key]
+
+    def _lookup(self, key):
+        """``(news, action)`` where action is None, "refresh", "fetch" or "wait".
+
+        For "fetch" and "wait" the first item is the future of the fetch in
+        flight instead of the news. Caller holds the lock.
+        """
+        now = time.time()
+        if now >= self._next_eviction:
+            self._evict_expired(now)
+        entry = self._entries.get(key)
+        age = now - entry.fetched_at if entry else None
+        if entry is not None and age < self.ttl:
+            self.hits += 1
+            return entry.news, None
+        if entry is not None and age < self.stale_ttl:
+            self.stale_hits += 1
+            if not entry.refreshing and self._take_budget():
+                entry.refreshing = True
+                return entry.news, "refresh"
+            return entry.news, None
+        flight = self._inflight.get(key)
+        if flight is not None:
+            self.misses += 1
+            return flight, "wait"
+        if not self._take_budget():
+            logger.warning(f"NewsAPI request budget ({self.budget}) spent, not fetching '{key[0]}'")
+            if entry is not None:
+                self.stale_hits += 1
+                return entry.news, None
+            self.misses += 1
+            return EMPTY_NEWS, None
+        self.misses += 1
+        flight = self._inflight[key] = Future()
+        return flight, "fetch"
+
+    def _store(self, key, news):
+        with self._lock:
+            entry = self._entries.get(key)
+            if isinstance(news, dict) and news.get("status") == "ok":
+                self._entries[key] = _Entry(news, time.time())
+                return news
+            logger.warning(f"NewsAPI error for '{key[0]}': {news.get('message') if isinstance(news, dict) else news}")
+            if entry is not None:
+                entry.refreshing = False
+                return entry.news
+            return EMPTY_NEWS
+
+    def _fallback(self, key, error):
+        # NewsAPI failed (or its circuit is open): an expired result is better than none
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            raise error
+        logger.warning(f"NewsAPI unavailable, serving expired news for '{key[0]}'")
+        return entry.news
+
+    def _complete(self, key, flight, fetched):
+        """Store the outcome of a fetch and hand it to the waiters; ``fetched`` is an answer or an exception."""
+        try:
+            if isinstance(fetched, BaseException):
+                news = self._fallback(key, fetched)
+            else:
+                news = self._store(key, fetched)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        flight.set_result(news)
+        return news
+
+    def _refresh(self, key, topic, page_size):
+        try:
+            self._store(key, self.fetch(topic, page_size))
+        except Exception as e:
+            logger.warning(f"Background NewsAPI refresh failed for '{topic}': {e}")
+            with self._lock:
+                if key in self._entries:
+                    self._entries[key].refreshing = False
+
+    def get(self, topic, page_size=3):
+        key = (normalize_topic(topic), page_size)
+        with self._lock:
+            news, action = self._lookup(key)
+        if action == "refresh":
+            self._executor.submit(self._refresh, key, topic, page_size)
+        elif action == "fetch":
+            try:
+                fetched = self.fetch(topic, page_size)
+            except Exception as e:
+                fetched = e
+            news = self._complete(key, news, fetched)
+        elif action == "wait":
+            news = news.result()
+        return news
+
+    async def _arefresh(self, key, topic, page_size):
+        try:
+            self._store(key, await self.afetch(topic, page_size))
+        except Exception as e:
+            logger.warning(f"Background NewsAPI refresh failed for '{topic}': {e}")
+            with self._lock:
+                if key in self._entries:
+                    self._entries[key].refreshing = False
+
+    async def aget(self, topic, page_size=3):
+        key = (normalize_topic(topic), page_size)
+        with self._lock:
+            news, action = self._lookup(key)
+        if action == "refresh":
+            asyncio.ensure_future(self._arefresh(key, topic, page_size))
+        elif action == "fetch":
+            try:
+                fetched = await self.afetch(topic, page_size)
+            except asyncio.CancelledError as e:
+                # Waiters must not hang on a fetch that will never finish
+                self._complete(key, news, e)
+                raise
+            except Exception as e:
+                fetched = e
+            news = self._complete(key, news, fetched)
+        elif action == "wait":
+            news = await asyncio.wrap_future(news)
+        return news
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "topics": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "budget_used": len(self._requests),
+            }
@@ -1,6 +1,7 @@
-from openai import OpenAI
 from config import Config
-import requests
+from http_clients import for_deadline, get_openai_client, get_session, http_timeout
+from stage_graph import StageGraph
+from resilience import breaker, remaining_timeout
 import logging
 
 NEWSAPI_API_KEY = Config.NEWSAPI_API_KEY
@@ -9,8 +10,8 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 logger = logging.getLogger(__name__)
 
 def get_recent_news(topic):
-    url = f"https://newsapi.org/v2/everything?q={topic}&apiKey={NEWSAPI_API_KEY}"
-    response = requests.get(url)
+    url = f"{Config.NEWSAPI_BASE_URL}/everything"
+    response = breaker("newsapi").call(get_session().get, url, params={"q": topic, "apiKey": NEWSAPI_API_KEY}, timeout=http_timeout())
     articles = response.json()["articles"]
     titles = [article["title"] for article in articles[:3]]
     urls = [article["url"] for article in articles[:3]]
@@ -22,7 +23,16 @@ def get_recent_news(topic):
 
 class NewsPostGenerator():
     def __init__(self):
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+        self.client = get_openai_client()
+        # The NewsAPI fetch and the title do not depend on each other; meta waits for the title, the post for the news
+        self.post_graph = (
+            StageGraph("News post v1", inputs=["topic"])
+            .add("recent_news", get_recent_news, "topic")
+            .add("title", self.generate_title, "topic")
+            .add("meta_description", self.generate_meta_description, "title")
+            .add("post_content", self.generate_post_content, "topic", "recent_news")
+        )
+        self.last_timings = {}
         return
 
     def get_news_topic(self, questions):
@@ -37,7 +47,9 @@ Your answer should not contain more than three words."""
         messages.extend(
 			{"role": "user", "content": question} for question in questions
 		)
-        response = self.client.chat.completions.create(
+        response = breaker("openai").call(
+            for_deadline(self.client).chat.completions.create,
+            timeout=remaining_timeout(Config.LLM_TIMEOUT),
 		    model = "gpt-4.1-nano",
 		    messages=messages,
             max_tokens=50,
@@ -46,11 +58,11 @@ Your answer should not contain more than three words."""
             temperature=0.7)
         return response.choices[0].message.content 
     
-    def generate_post(self, topic):
-        recent_news = get_recent_news(topic)
-
+    def generate_title(self, topic):
         prompt_title = f"Come up with an eye-catching headline for a post on the topic: {topic}. Answer in Russian. Add formattings and emojies to make it attractive post title at Telegram."
-        response_title = self.client.chat.completions.create(
+        response_title = breaker("openai").call(
+            for_deadline(self.client).chat.completions.create,
+            timeout=remaining_timeout(Config.LLM_TIMEOUT),
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt_title}],
             max_tokens=50,
@@ -60,9 +72,13 @@ Your answer should not contain more than three words."""
         )
         title = response_title.choices[0].message.content.strip()
         #logger.info(f"post title: {title}")
+        return title
 
+    def generate_meta_description(self, title):
         prompt_meta = f"Write a brief but informative meta description for the post with the title: {title}. Do not include title in the meta description. Answer in Russian. Add formattings and emojies to make it attractive post description at Telegram. This should be displayed in the fine print."
-        response_meta = self.client.chat.completions.create(
+        response_meta = breaker("openai").call(
+            for_deadline(self.client).chat.completions.create,
+            timeout=remaining_timeout(Config.LLM_TIMEOUT),
             model="gpt-4o-mini",
             messages=[{"role": "user", "content": prompt_meta}],
             max_tokens=100,
@@ -72,9 +88,13 @@ Your answer should not contain more than three words."""
         )
         meta_description = response_meta.choices[0].message.content.strip()
         #logger.info(f"post meta: {meta_description}")
+        return meta_description
 
+    def generate_post_content(self, topic, recent_news):
         prompt_post = f"Write a detailed and engaging blog post on {topic}, keeping in mind the following recent news:\n{recent_news}\n\n\n\n Use short paragraphs, subheadings, examples and keywords for better comprehension and SEO optimization. Answer in Russian. Add formattings and emojies to make it attractive post at Telegram. Do not generate text longer than 512 charachters."
-        response_post = self.client.chat.completions.create(
+        response_post = breaker("openai").call(
+            for_deadline(self.client).chat.completions.create,
+            timeout=remaining_timeout(Config.LLM_TIMEOUT),
             model="gpt-4o",
             messages=[{"role": "user", "content": prompt_post}],
             max_tokens=512,
@@ -84,17 +104,22 @@ Your answer should not contain more than three words."""
         )
         post_content = response_post.choices[0].message.content.strip() + "\n" + recent_news['links']
         #logger.info(f"post: {post_content}")
+        return post_content
 
+    def generate_post(self, topic):
+        run = self.post_graph.run(topic=topic)
+        self.last_timings = run.timings
         return {
-            "title": title,
-            "meta_description": meta_description,
-            "post_content": post_content
+            "title": run.results["title"],
+            "meta_description": run.results["meta_description"],
+            "post_content": run.results["post_content"]
         }
 
 
-    def get_answer(self, questions):
+    def get_answer(self, questions, topic=None):
         #logger.info(f"conversation: {questions}")
-        topic = self.get_news_topic(questions)
+        if not topic:
+            topic = self.get_news_topic(questions)
         #logger.info(f"news topic: {topic}")
         post = self.generate_post(topic)
         
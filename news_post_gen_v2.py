@@ -1,93 +1,267 @@
-from langchain_openai import ChatOpenAI
+import math
+import re
 from config import Config
-import requests
 from langchain_core.prompts import PromptTemplate
 from random import randint
 from converstion_complete import Colocutor
+from http_clients import for_deadline, get_async_http_client, get_chat_llm, get_session, http_timeout
+from llm_cache import make_key, response_cache
+from news_cache import NewsCache
+from stage_graph import StageGraph
+from resilience import breaker, remaining_timeout
 
 NEWS_API_KEY = Config.NEWSAPI_API_KEY
+MODEL = "gpt-4.1-nano"
 
 import logging  
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Retrieve news
-def get_news(topic, api_key, page_size=3):
-    url = f"https://newsapi.org/v2/everything?q={topic}&apiKey={api_key}&language=en&sortBy=publishedAt&pageSize={page_size}"
-    response = requests.get(url)
+def _news_params(topic, page_size):
+    # Locally extracted topics keep the chat's language
+    language = "ru" if re.search(r"[а-яА-ЯёЁ]", topic) else "en"
+    return {"q": topic, "apiKey": NEWS_API_KEY, "language": language, "sortBy": "publishedAt", "pageSize": page_size}
+
+def _fetch_news(topic, page_size):
+    response = get_session().get(f"{Config.NEWSAPI_BASE_URL}/everything", params=_news_params(topic, page_size), timeout=http_timeout())
+    if response.status_code >= 500:
+        response.raise_for_status()
     return response.json()
 
-def run_chain(template, input, llm):
+async def _afetch_news(topic, page_size):
+    response = await get_async_http_client().get(f"{Config.NEWSAPI_BASE_URL}/everything", params=_news_params(topic, page_size))
+    if response.status_code >= 500:
+        response.raise_for_status()
+    return response.json()
+
+def fetch_news(topic, page_size=3):
+    return breaker("newsapi").call(_fetch_news, topic, page_size)
+
+async def afetch_news(topic, page_size=3):
+    return await breaker("newsapi").acall(_afetch_news, topic, page_size)
+
+# Topics repeat across chats and hours; NewsAPI is asked at most once per topic and TTL
+news_cache = NewsCache(
+    fetch_news,
+    afetch_news,
+    ttl=Config.NEWS_CACHE_TTL_SECONDS,
+    stale_ttl=Config.NEWS_CACHE_STALE_SECONDS,
+    budget=Config.NEWSAPI_DAILY_BUDGET,
+)
+
+def get_news(topic, page_size=3):
+    return news_cache.get(topic, page_size)
+
+async def aget_news(topic, page_size=3):
+    return await news_cache.aget(topic, page_size)
+
+class NoNewsError(Exception):
+    """No articles for the topic (none found, or the NewsAPI budget is spent): there is nothing to post about."""
+
+def _require_articles(topic, news):
+    if not (news or {}).get("articles"):
+        raise NoNewsError(f"no articles for '{topic}'")
+    return news
+
+def get_articles_news(topic):
+    return _require_articles(topic, get_news(topic))
+
+async def aget_articles_news(topic):
+    return _require_articles(topic, await aget_news(topic))
+
+# Compact articles for the summary prompt
+_CHARS_TAIL = re.compile(r"\s*(?:…|\.\.\.)?\s*\[\+\d+ chars\]\s*$")
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+NEAR_DUPLICATE_SIMILARITY = 0.8
+
+def estimate_tokens(text):
+    """Rough BPE token count without a tokenizer: a word costs one token per ~4 characters, punctuation one each."""
+    return sum(math.ceil(len(piece) / 4) for piece in _TOKEN_PIECES.findall(text or ""))
+
+def _clean_field(value):
+    return " ".join(_CHARS_TAIL.sub("", value or "").split())
+
+def _title_words(article):
+    return set(re.findall(r"\w+", (article.get("title") or "").lower()))
+
+def _is_near_duplicate(words, seen):
+    return any(len(words & other) / len(words | other) >= NEAR_DUPLICATE_SIMILARITY for other in seen if words | other)
+
+def _truncate_to_tokens(text, budget):
+    used = 0
+    for word in re.finditer(r"\S+", text):
+        used += estimate_tokens(word.group())
+        if used > budget:
+            return text[:word.start()].rstrip() + "…"
+    return text
+
+def serialize_articles(news, token_budget=None):
+    """Title, description and content of each article as plain text within ``token_budget`` tokens.
+
+    NewsAPI noise (sources, image urls, "[+N chars]" tails) is dropped, and
+    articles whose titles nearly repeat an earlier one are skipped. The last
+    article that does not fit is cut at a word boundary.
+    """
+    token_budget = token_budget or Config.NEWS_PROMPT_TOKEN_BUDGET
+    blocks = []
+    seen = []
+    used = 0
+    for article in (news or {}).get("articles") or []:
+        words = _title_words(article)
+        if _is_near_duplicate(words, seen):
+            continue
+        seen.append(words)
+        lines = [f"{name}: {value}" for name, value in (
+            ("Title", _clean_field(article.get("title"))),
+            ("Description", _clean_field(article.get("description"))),
+            ("Content", _clean_field(article.get("content"))),
+        ) if value]
+        block = "\n".join(lines)
+        cost = estimate_tokens(block) + 1
+        if used + cost > token_budget:
+            remaining = token_budget - used
+            if remaining > 16:
+                blocks.append(_truncate_to_tokens(block, remaining))
+            break
+        blocks.append(block)
+        used += cost
+    return "\n\n".join(blocks)
+
+def _build_chain(template, input, llm):
     input_variables = list(input.keys())
 
     prompt = PromptTemplate(
         input_variables=input_variables,
         template=template,
     )
-    chain = prompt | llm
-    return chain.invoke(input).content
+    return prompt | for_deadline(llm).bind(timeout=remaining_timeout(Config.LLM_TIMEOUT))
+
+def run_chain(template, input, llm):
+    return breaker("openai").call(_build_chain(template, input, llm).invoke, input).content
+
+async def arun_chain(template, input, llm):
+    return (await breaker("openai").acall(_build_chain(template, input, llm).ainvoke, input)).content
+
+TOPIC_TEMPLATE = "Based on the following conversation, generate a relevant news topic to retrieve news from newsapi.org. It should not be more than two words:\n\n{conversation}\n\nTopic:"
+SUMMARY_TEMPLATE = "Summarize the following news articles in one sentence:\n\n{articles}\n\nSummary:"
+TITLE_TEMPLATE = "Generate a clear, explanatory title in Russian for this summary:\n\n{summary}\n\nTitle:"
+POST_TEMPLATE = "Generate a clear post in Russian based on this summary (max 512 characters, do not split by articles, express in one sentence, add emojies and format with MarkdownV2 to highligh most important parts):\n\n{summary}\n\nPost:"
+METADATA_TEMPLATE = "Generate metadata for this post, including a short description and links to the original news articles:\n\nSummary: {summary}\n\nArticles: {articles}\n\nMetadata:"
+
+def _format_post(title, post, news):
+    metadata = "\n\n".join([f"[{article['title']}]({article['url']})" for article in news['articles']])
+    return {
+        "title": f"*{title}*",
+        "meta_description": f"{metadata}",
+        "post_content": post,
+    }
+
+def _format_answer(post):
+    return f"{post['title']}\n\n{post['post_content']}\n\n{post['meta_description']}"
 
 class NewsPostGenerator_v2():
-    def __init__(self):
-        self.llm = ChatOpenAI(api_key=Config.OPENAI_API_KEY, temperature=0.7, model="gpt-4.1-nano")
+    def __init__(self, colocutor=None):
+        self.llm = get_chat_llm(MODEL, 0.7)
+        self.colocutor = colocutor or Colocutor()
+        # Title and post only need the summary, so they run concurrently
+        self.post_graph = (
+            StageGraph("News post", inputs=["conversation"])
+            .add("topic", lambda conversation: self.get_news_topic(conversation), "conversation")
+            .add("news", lambda topic: get_articles_news(topic), "topic")
+            .add("articles", lambda news: serialize_articles(news), "news")
+            .add("summary", lambda articles: self.generate_news_summary(articles), "articles")
+            .add("title", lambda summary: self.generate_news_title(summary), "summary")
+            .add("post", lambda summary: self.generate_news_post(summary), "summary")
+        )
+        self.apost_graph = (
+            StageGraph("News post (async)", inputs=["conversation"])
+            .add("topic", lambda conversation: self.aget_news_topic(conversation), "conversation")
+            .add("news", lambda topic: aget_articles_news(topic), "topic")
+            .add("articles", lambda news: serialize_articles(news), "news")
+            .add("summary", lambda articles: self.agenerate_news_summary(articles), "articles")
+            .add("title", lambda summary: self.agenerate_news_title(summary), "summary")
+            .add("post", lambda summary: self.agenerate_news_post(summary), "summary")
+        )
+        self.last_timings = {}
         return
 
     def get_news_topic(self, conversation):
-        # Generate news topic
-        return run_chain(
-            "Based on the following conversation, generate a relevant news topic to retrieve news from newsapi.org. It should not be more than two words:\n\n{conversation}\n\nTopic:", 
-            {"conversation": conversation}, 
-            self.llm)
-    
+        # Generate news topic, reused for the cache TTL while the conversation is unchanged
+        input = {"conversation": conversation}
+        return response_cache.get_or_compute(
+            make_key(MODEL, TOPIC_TEMPLATE, input), lambda: run_chain(TOPIC_TEMPLATE, input, self.llm))
 
     def generate_news_summary(self, articles):
         # Generate news summary
-        return run_chain(
-            "Summarize the following news articles in one sentence:\n\n{articles}\n\nSummary:", 
-            {"articles": articles}, 
-            self.llm)
+        return run_chain(SUMMARY_TEMPLATE, {"articles": articles}, self.llm)
 
     def generate_news_title(self, summary):
         # Generate post title
-        return run_chain(
-            "Generate a clear, explanatory title in Russian for this summary:\n\n{summary}\n\nTitle:", 
-            {"summary": summary}, 
-            self.llm)
+        return run_chain(TITLE_TEMPLATE, {"summary": summary}, self.llm)
 
     def generate_news_post(self, summary):
         # Generate post
-        return run_chain(
-            "Generate a clear post in Russian based on this summary (max 512 characters, do not split by articles, express in one sentence, add emojies and format with MarkdownV2 to highligh most important parts):\n\n{summary}\n\nPost:", 
-            {"summary": summary}, 
-            self.llm)
+        return run_chain(POST_TEMPLATE, {"summary": summary}, self.llm)
 
     def generate_news_metadata(self, summary, articles):
         # Generate metadata
-        return run_chain(
-            "Generate metadata for this post, including a short description and links to the original news articles:\n\nSummary: {summary}\n\nArticles: {articles}\n\nMetadata:", 
-            {"summary": summary, "articles": articles}, 
-            self.llm)
+        return run_chain(METADATA_TEMPLATE, {"summary": summary, "articles": articles}, self.llm)
+
+    def _run_post_graph(self, **inputs):
+        run = self.post_graph.run(**inputs)
+        self.last_timings = run.timings
+        return _format_post(run.results["title"], run.results["post"], run.results["news"])
 
     def generate_post(self, topic):
-        news = get_news(topic, NEWS_API_KEY)
-        articles = "\n\n".join([f"Title: {article['title']}\nDescription: {article['description']}\nContent: {article['content']}\nLink: {article['url']}" for article in news['articles']])
-        summary = self.generate_news_summary(news)
-        title = self.generate_news_title(summary)
-        post = self.generate_news_post(summary)
-        metadata = "\n\n".join([f"[{article['title']}]({article['url']})" for article in news['articles']])
-        return {
-            "title": f"*{title}*",
-            "meta_description": f"{metadata}",
-            "post_content": post,
-        }
-
-
-    def get_answer(self, questions):
+        return self._run_post_graph(topic=topic)
+
+    def get_answer(self, questions, topic=None):
+        # topic: a locally extracted query; without one the LLM derives it from the conversation
+        # Returns None when there are no articles, so the post is skipped instead of written about nothing
+        if randint(1, 3) == 3:
+            return self.colocutor.get_answer(questions)
+        try:
+            if topic:
+                return _format_answer(self._run_post_graph(topic=topic))
+            return _format_answer(self._run_post_graph(conversation=questions))
+        except NoNewsError as e:
+            logger.info(f"Skipping news post: {e}")
+            return None
+
+    # Coroutine counterparts used by the asyncio runtime (swear_async.py)
+    async def aget_news_topic(self, conversation):
+        input = {"conversation": conversation}
+        return await response_cache.aget_or_compute(
+            make_key(MODEL, TOPIC_TEMPLATE, input), lambda: arun_chain(TOPIC_TEMPLATE, input, self.llm))
+
+    async def agenerate_news_summary(self, articles):
+        return await arun_chain(SUMMARY_TEMPLATE, {"articles": articles}, self.llm)
+
+    async def agenerate_news_title(self, summary):
+        return await arun_chain(TITLE_TEMPLATE, {"summary": summary}, self.llm)
+
+    async def agenerate_news_post(self, summary):
+        return await arun_chain(POST_TEMPLATE, {"summary": summary}, self.llm)
+
+    async def _arun_post_graph(self, **inputs):
+        run = await self.apost_graph.arun(**inputs)
+        self.last_timings = run.timings
+        return _format_post(run.results["title"], run.results["post"], run.results["news"])
+
+    async def agenerate_post(self, topic):
+        return await self._arun_post_graph(topic=topic)
+
+    async def aget_answer(self, questions, topic=None):
         if randint(1, 3) == 3:
-            return Colocutor().get_answer(questions)
-        topic = self.get_news_topic(questions)
-        post = self.generate_post(topic)
-        return f"{post['title']}\n\n{post['post_content']}\n\n{post['meta_description']}"
+            return await self.colocutor.aget_answer(questions)
+        try:
+            if topic:
+                return _format_answer(await self._arun_post_graph(topic=topic))
+            return _format_answer(await self._arun_post_graph(conversation=questions))
+        except NoNewsError as e:
+            logger.info(f"Skipping news post: {e}")
+            return None
 
 if __name__ == "__main__":
     generator = NewsPostGenerator_v2()
@@ -0,0 +1,430 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_REPLY = 0
+PRIORITY_PERIODIC = 1
+PRIORITY_DELETE = 2
+
+DEFAULT_GLOBAL_RATE = 30.0
+DEFAULT_CHAT_RATE = 1.0
+DEFAULT_CHAT_BURST = 3
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_WORKERS = 8
+DEFAULT_DELETE_BATCH = 100
+BUCKET_SWEEP_INTERVAL = 60.0
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def delay(self, now: float) -> float:
+        """Seconds until one token is available (0 if it is available now)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = 0.0 if self.tokens >= 1.0 else (1.0 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self) -> None:
+        self.tokens -= 1.0
+
+    def is_idle(self, now: float) -> bool:
+        """True when the bucket is full again, i.e. equal to a freshly created one."""
+        return self.delay(now) <= 0 and self.tokens >= self.capacity and self.blocked_until <= now
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "fn", "args", "kwargs", "future", "attempts")
+
+    def __init__(self, priority, seq, fn, args, kwargs):
+        self.priority = priority
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.attempts = 0
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+def retry_after_seconds(e: ApiTelegramException):
+    """``retry_after`` of a 429 answer, or None for any other error."""
+    if getattr(e, "error_code", None) != 429:
+        return None
+    parameters = (getattr(e, "result_json", None) or {}).get("parameters") or {}
+    return float(parameters.get("retry_after", 1))
+
+
+class OutboundDispatcher:
+    """Single funnel for Bot API calls that change chats (sends, deletes).
+
+    Calls are queued per chat and released by one dispatcher thread when both
+    the global token bucket (~30 requests/s) and the chat's own bucket allow
+    it; lower ``priority`` values go first, so replies to users overtake
+    periodic messages and cleanups. A 429 answer blocks the chat for the
+    returned ``retry_after`` and the call is queued again, up to
+    ``max_retries`` times, instead of being lost. Deletes requested through
+    ``delete`` are coalesced per chat into ``delete_messages`` calls of at
+    most ``delete_batch`` ids; if a batch is refused, its messages are queued
+    again as single deletes that go through the same buckets.
+
+    Each chat with queued calls has exactly one live entry, either in the
+    ready heap (ordered by its most urgent call) or in the waiting heap
+    (ordered by the time its bucket refills). Rescheduling a chat issues a new
+    token, which turns its older heap entries into no-ops. Buckets of chats
+    without queued calls are dropped once they have refilled.
+    """
+
+    def __init__(self, bot, global_rate=DEFAULT_GLOBAL_RATE, chat_rate=DEFAULT_CHAT_RATE,
+                 chat_burst=DEFAULT_CHAT_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                 workers=DEFAULT_WORKERS, delete_batch=DEFAULT_DELETE_BATCH):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.delete_batch = delete_batch
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: dict[object, TokenBucket] = {}
+        self._chat_jobs: dict[object, list[_Job]] = {}
+        self._chat_entries: dict[object, tuple] = {}
+        self._pending_deletes: dict[object, deque] = {}
+        self._ready: list = []
+        self._waiting: list = []
+        self._seq = itertools.count()
+        self._next_sweep = time.monotonic() + BUCKET_SWEEP_INTERVAL
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="outbound")
+        self._thread = threading.Thread(target=self._run, name="outbound-dispatcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, chat_id, fn, *args, priority=PRIORITY_PERIODIC, **kwargs) -> Future:
+        job = _Job(priority, next(self._seq), fn, args, kwargs)
+        with self._condition:
+            self._push(chat_id, job)
+        return job.future
+
+    def call(self, chat_id, fn, *args, priority=PRIORITY_PERIODIC, **kwargs):
+        """Queue ``fn(*args, **kwargs)`` for ``chat_id`` and wait for its result."""
+        return self.submit(chat_id, fn, *args, priority=priority, **kwargs).result()
+
+    def delete(self, chat_id, message_id) -> Future:
+        """Queue a delete; the future resolves to True if the message was deleted."""
+        future = Future()
+        with self._condition:
+            pending = self._pending_deletes.get(chat_id)
+            if pending is None:
+                pending = self._pending_deletes[chat_id] = deque()
+                self._push_delete_job(chat_id)
+            pending.append((message_id, future))
+        return future
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                "queued": sum(len(jobs) for jobs in self._chat_jobs.values()),
+                "chats": len(self._chat_jobs),
+                "pending_deletes": sum(len(pending) for pending in self._pending_deletes.values()),
+            }
+
+    def _push_delete_job(self, chat_id):
+        # The batch list is filled on first execution and kept for retries.
+        batch = []
+        job = _Job(PRIORITY_DELETE, next(self._seq), self._delete_batch, (chat_id, batch), {})
+        job.future.add_done_callback(lambda future: self._fail_deletes(future, batch))
+        self._push(chat_id, job)
+
+    def _push(self, chat_id, job):
+        # Caller holds the condition.
+        heapq.heappush(self._chat_jobs.setdefault(chat_id, []), job)
+        entry = self._chat_entries.get(chat_id)
+        if entry is None or (entry[1] is not None and job.priority < entry[1]):
+            self._schedule_chat(chat_id, time.monotonic())
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _sweep_buckets(self, now):
+        # A full, unblocked bucket behaves like a new one, so dropping it loses nothing.
+        self._next_sweep = now + BUCKET_SWEEP_INTERVAL
+        idle = [
+            chat_id for chat_id, bucket in self._chat_buckets.items()
+            if chat_id not in self._chat_jobs and bucket.is_idle(now)
+        ]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    def _schedule_chat(self, chat_id, now):
+        token = next(self._seq)
+        delay = self._bucket(chat_id).delay(now)
+        if delay > 0:
+            self._chat_entries[chat_id] = (token, None)
+            heapq.heappush(self._waiting, (now + delay, token, chat_id))
+        else:
+            priority = self._chat_jobs[chat_id][0].priority
+            self._chat_entries[chat_id] = (token, priority)
+            heapq.heappush(self._ready, (priority, token, chat_id))
+        self._condition.notify()
+
+    def _is_live(self, token, chat_id) -> bool:
+        entry = self._chat_entries.get(chat_id)
+        return entry is not None and entry[0] == token
+
+    def _next_job(self):
+        # Caller holds the condition. Waits until a call may be sent and returns it.
+        while True:
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                self._sweep_buckets(now)
+            while self._waiting and self._waiting[0][0] <= now:
+                _, token, chat_id = heapq.heappop(self._waiting)
+                if self._is_live(token, chat_id):
+                    self._schedule_chat(chat_id, now)
+            while self._ready and not self._is_live(self._ready[0][1], self._ready[0][2]):
+                heapq.heappop(self._ready)
+
+            timeout = self._waiting[0][0] - now if self._waiting else None
+            if self._ready:
+                global_delay = self._global_bucket.delay(now)
+                if global_delay <= 0:
+                    _, _, chat_id = heapq.heappop(self._ready)
+                    del self._chat_entries[chat_id]
+                    jobs = self._chat_jobs[chat_id]
+                    job = heapq.heappop(jobs)
+                    self._global_bucket.take()
+                    self._chat_buckets[chat_id].take()
+                    if jobs:
+                        self._schedule_chat(chat_id, now)
+                    else:
+                        del self._chat_jobs[chat_id]
+                    return chat_id, job
+                timeout = global_delay if timeout is None else min(timeout, global_delay)
+            self._condition.wait(timeout)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                chat_id, job = self._next_job()
+            self._executor.submit(self._execute, chat_id, job)
+
+    def _execute(self, chat_id, job):
+        job.attempts += 1
+        try:
+            result = job.fn(*job.args, **job.kwargs)
+        except ApiTelegramException as e:
+            retry_after = retry_after_seconds(e)
+            if retry_after is None or job.attempts > self.max_retries:
+                job.future.set_exception(e)
+                return
+            logger.warning(f"Rate limited in chat {chat_id}, retrying in {retry_after:.1f}s")
+            self._retry(chat_id, job, retry_after)
+        except Exception as e:
+            job.future.set_exception(e)
+        else:
+            job.future.set_result(result)
+
+    def _retry(self, chat_id, job, retry_after):
+        for arg in job.args:
+            # Uploaded files (voice buffers) were consumed by the failed attempt.
+            if hasattr(arg, "seek"):
+                arg.seek(0)
+        with self._condition:
+            bucket = self._bucket(chat_id)
+            bucket.blocked_until = time.monotonic() + retry_after
+            heapq.heappush(self._chat_jobs.setdefault(chat_id, []), job)
+            self._schedule_chat(chat_id, time.monotonic())
+
+    def _delete_batch(self, chat_id, batch):
+        if not batch:
+            with self._condition:
+                pending = self._pending_deletes[chat_id]
+                batch.extend(pending.popleft() for _ in range(min(self.delete_batch, len(pending))))
+                if pending:
+                    self._push_delete_job(chat_id)
+                else:
+                    del self._pending_deletes[chat_id]
+
+        message_ids = [message_id for message_id, _ in batch]
+        try:
+            self.bot.delete_messages(chat_id, message_ids)
+        except ApiTelegramException as e:
+            if retry_after_seconds(e) is not None:
+                raise
+            logger.warning(f"Bulk delete failed for chat {chat_id}: {e}")
+            # Each message gets its own job, so the fallback is rate limited and retried like any call
+            with self._condition:
+                for message_id, future in batch:
+                    self._push_single_delete(chat_id, message_id, future)
+            return
+        for _, future in batch:
+            future.set_result(True)
+
+    def _push_single_delete(self, chat_id, message_id, future):
+        # Caller holds the condition.
+        job = _Job(PRIORITY_DELETE, next(self._seq), self._delete_single, (chat_id, message_id), {})
+        job.future.add_done_callback(
+            lambda job_future: future.set_result(job_future.exception() is None and job_future.result())
+        )
+        self._push(chat_id, job)
+
+    def _delete_single(self, chat_id, message_id):
+        try:
+            self.bot.delete_message(chat_id, message_id)
+        except ApiTelegramException as e:
+            if retry_after_seconds(e) is not None:
+                raise
+            logger.warning(f"Failed to delete bot message {message_id} in chat {chat_id}: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _fail_deletes(job_future, batch):
+        if job_future.exception() is None:
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(False)
+
+
+class AsyncOutboundDispatcher:
+    """Coroutine counterpart of ``OutboundDispatcher`` for the asyncio runtime.
+
+    ``call`` waits for a grant from one dispatcher task that applies the same
+    global and per-chat token buckets and priority classes, then awaits the
+    Bot API coroutine itself. A 429 answer blocks the chat for the returned
+    ``retry_after`` and the call waits for a new grant, up to ``max_retries``
+    times. Deletes are not coalesced here; callers batch them with
+    ``delete_messages`` themselves.
+    """
+
+    def __init__(self, global_rate=DEFAULT_GLOBAL_RATE, chat_rate=DEFAULT_CHAT_RATE,
+                 chat_burst=DEFAULT_CHAT_BURST, max_retries=DEFAULT_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: dict[object, TokenBucket] = {}
+        self._waiting: dict[object, list] = {}
+        self._seq = itertools.count()
+        self._next_sweep = time.monotonic() + BUCKET_SWEEP_INTERVAL
+        self._wakeup = None
+        self._task = None
+
+    def start(self):
+        """Start the dispatcher task; must be called from the running event loop."""
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def call(self, chat_id, fn, *args, priority=PRIORITY_PERIODIC, **kwargs):
+        """Await ``fn(*args, **kwargs)`` for ``chat_id`` once the buckets allow it."""
+        attempts = 0
+        while True:
+            await self._grant(chat_id, priority)
+            attempts += 1
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is None or attempts > self.max_retries:
+                    raise
+                logger.warning(f"Rate limited in chat {chat_id}, retrying in {retry_after:.1f}s")
+                for arg in args:
+                    # Uploaded files (voice buffers) were consumed by the failed attempt.
+                    if hasattr(arg, "seek"):
+                        arg.seek(0)
+                self._bucket(chat_id).blocked_until = time.monotonic() + retry_after
+
+    def stats(self) -> dict:
+        return {
+            "queued": sum(len(waiters) for waiters in self._waiting.values()),
+            "chats": len(self._waiting),
+        }
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    async def _grant(self, chat_id, priority):
+        grant = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting.setdefault(chat_id, []), (priority, next(self._seq), grant))
+        self._wakeup.set()
+        await grant
+
+    def _sweep_buckets(self, now):
+        self._next_sweep = now + BUCKET_SWEEP_INTERVAL
+        idle = [
+            chat_id for chat_id, bucket in self._chat_buckets.items()
+            if chat_id not in self._waiting and bucket.is_idle(now)
+        ]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    def _next_grant(self, now):
+        """``(grant, None)`` for the most urgent call whose chat may send now, else ``(None, seconds to wait)``."""
+        best = None
+        wait = None
+        for chat_id, waiters in list(self._waiting.items()):
+            # Callers cancelled while waiting leave done futures behind
+            while waiters and waiters[0][2].done():
+                heapq.heappop(waiters)
+            if not waiters:
+                del self._waiting[chat_id]
+                continue
+            delay = self._bucket(chat_id).delay(now)
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+            elif best is None or waiters[0][:2] < self._waiting[best][0][:2]:
+                best = chat_id
+        if best is None:
+            return None, wait
+        global_delay = self._global_bucket.delay(now)
+        if global_delay > 0:
+            return None, global_delay if wait is None else min(wait, global_delay)
+        waiters = self._waiting[best]
+        _, _, grant = heapq.heappop(waiters)
+        if not waiters:
+            del self._waiting[best]
+        self._global_bucket.take()
+        self._chat_buckets[best].take()
+        return grant, None
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            if now >= self._next_sweep:
+                self._sweep_buckets(now)
+            grant, wait = self._next_grant(now)
+            if grant is not None:
+                grant.set_result(None)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,216 @@
+"""Deadlines and circuit breakers for calls to external services.
+
+A deadline is set around one periodic send with ``deadline(seconds)`` and
+lives in a context variable, so every HTTP or LLM call made while producing
+that message can shrink its own timeout to ``remaining_timeout(default)``.
+``StageGraph`` copies the context into its worker threads, and
+``run_with_deadline`` runs a function in another thread under a deadline and
+stops waiting for it once the deadline passes. Its threads come from one pool
+per ``pool`` name (the periodic senders use their message generator), so calls
+left running past their deadline by a hung dependency only use up the pool of
+the mode that depends on it.
+
+Each dependency (``openai``, ``gigachat``, ``newsapi``) has one
+``CircuitBreaker`` from ``breaker(name)``. After ``failure_threshold``
+consecutive failures it opens and rejects calls immediately with
+``CircuitOpenError`` for ``reset_timeout`` seconds, then lets a single trial
+call through; its outcome closes or reopens the circuit. A call that fails
+with ``DeadlineExceeded``, is cancelled, raises after the deadline has
+passed, or times out while a deadline is set ran out of the caller's time
+and is not held against the dependency. While a deadline is set, LLM
+clients are used without SDK retries (``http_clients.for_deadline``), since
+each retry would get the whole remaining time again.
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MIN_CALL_TIMEOUT = 1.0
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_timeout(default):
+    """``default`` capped by what is left of the current deadline (never below ``MIN_CALL_TIMEOUT``)."""
+    due = _deadline.get()
+    if due is None:
+        return default
+    remaining = due - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("Deadline exceeded before the call started")
+    return max(MIN_CALL_TIMEOUT, min(default, remaining))
+
+
+def deadline_active() -> bool:
+    return _deadline.get() is not None
+
+
+def _is_timeout(error) -> bool:
+    # SDK timeouts (openai.APITimeoutError, httpx.TimeoutException, requests' Timeout) share no base class
+    return isinstance(error, TimeoutError) or any("Timeout" in cls.__name__ for cls in type(error).__mro__)
+
+
+def cut_by_deadline(error) -> bool:
+    """True when ``error`` comes from the caller's deadline rather than from the dependency."""
+    if isinstance(error, DeadlineExceeded):
+        return True
+    due = _deadline.get()
+    if due is None:
+        return False
+    return time.monotonic() >= due or _is_timeout(error)
+
+
+def send_deadline(sending_interval_range):
+    """Deadline of one periodic send: a share of the mode's shortest interval, within configured bounds."""
+    seconds = min(sending_interval_range) * Config.SEND_DEADLINE_FRACTION
+    return min(Config.SEND_DEADLINE_MAX_SECONDS, max(Config.SEND_DEADLINE_MIN_SECONDS, seconds))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _deadline_pool(name) -> ThreadPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(
+                max_workers=max(1, Config.SEND_WORKERS), thread_name_prefix=f"deadline-{name}"
+            )
+        return pool
+
+
+def run_with_deadline(seconds, fn, *args, pool="default", **kwargs):
+    """Run ``fn`` on the ``pool`` threads under a deadline; raises ``DeadlineExceeded`` when it is not done in time.
+
+    A timed-out call keeps running in the background until its own client
+    timeouts end it; its result is discarded.
+    """
+    def run():
+        with deadline(seconds):
+            return fn(*args, **kwargs)
+
+    future = _deadline_pool(pool).submit(contextvars.copy_context().run, run)
+    try:
+        return future.result(timeout=seconds)
+    except TimeoutError:
+        future.cancel()
+        raise DeadlineExceeded(f"{getattr(fn, '__name__', fn)} did not finish within {seconds:g}s") from None
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _before(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit {self.name} half-open, letting a trial call through")
+                return
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit {self.state})")
+
+    def _after(self, ok):
+        """Record a call's outcome; ``ok`` None means it says nothing about the dependency."""
+        with self._lock:
+            if ok is None:
+                if self.state == self.HALF_OPEN:
+                    # The trial did not finish; let the next call be the trial
+                    self.state = self.OPEN
+                    self.opened_at = time.monotonic() - self.reset_timeout
+                return
+            if ok:
+                if self.state != self.CLOSED:
+                    logger.info(f"Circuit {self.name} closed")
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit {self.name} open after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        self._before()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self._after(None if cut_by_deadline(e) else False)
+            raise
+        self._after(True)
+        return result
+
+    async def acall(self, fn, *args, **kwargs):
+        self._before()
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            self._after(None)
+            raise
+        except Exception as e:
+            self._after(None if cut_by_deadline(e) else False)
+            raise
+        self._after(True)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, Config.CIRCUIT_FAILURE_THRESHOLD, Config.CIRCUIT_RESET_SECONDS)
+        return _breakers[name]
+
+
+def breaker_stats() -> dict:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {item.name: item.stats() for item in breakers}
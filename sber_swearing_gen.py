@@ -1,8 +1,10 @@
-import requests
 import json
+import threading
 import time
 import uuid
 from config import Config
+from http_clients import get_session, http_timeout
+from resilience import breaker
 
 import logging  
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -42,41 +44,95 @@ promt_sber = {
 }
 
 
-class SberSwearingGenerator():
-	def __init__(self):
-		return
-	def get_auth_token(self):
-		auth_url = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
-		payload = f'scope={SCOPE_SBER}'
-		rq_uid = uuid.uuid4()
+AUTH_URL = "https://ngw.devices.sberbank.ru:9443/api/v2/oauth"
+COMPLETION_URL = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
+# Refresh the token this long before it expires (GigaChat tokens live 30 minutes)
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+DEFAULT_TOKEN_LIFETIME_SECONDS = 30 * 60
+
+
+def _build_payload(question):
+	# A fresh payload per call; promt_sber is a template and is never mutated
+	payload = dict(promt_sber)
+	payload['messages'] = promt_sber['messages'][:-1] + [{'role': 'user', 'content': question}]
+	return json.dumps(payload)
+
+
+class GigaChatTokenManager():
+	"""Caches the GigaChat OAuth token until shortly before it expires.
+
+	Concurrent callers that find the token stale wait for a single refresh
+	instead of each posting to the OAuth endpoint.
+	"""
+	def __init__(self, auth=GIGA_CHAT_AUTH, scope=SCOPE_SBER, refresh_margin=TOKEN_REFRESH_MARGIN_SECONDS):
+		self.auth = auth
+		self.scope = scope
+		self.refresh_margin = refresh_margin
+		self._token = None
+		self._expires_at = 0.0
+		self._lock = threading.Lock()
+
+	def _fetch(self):
 		headers = {
 			'Content-Type': 'application/x-www-form-urlencoded',
 			'Accept': 'application/json',
-			'RqUID': str(rq_uid),
-			'Authorization': f'Basic {GIGA_CHAT_AUTH}',
+			'RqUID': str(uuid.uuid4()),
+			'Authorization': f'Basic {self.auth}',
 		}
-		response = requests.request("POST", auth_url, headers=headers, data=payload, verify=True)
-		return json.loads(response.text)['access_token']
-	
-	def get_answer(self, question):
-		access_token = self.get_auth_token()
-		completion_url = "https://gigachat.devices.sberbank.ru/api/v1/chat/completions"
-		promt_sber['messages'][len(promt_sber['messages'])-1]['content'] = question
+		response = get_session().post(AUTH_URL, headers=headers, data=f'scope={self.scope}', verify=True, timeout=http_timeout())
+		response.raise_for_status()
+		data = response.json()
+		# expires_at is a Unix timestamp in milliseconds
+		expires_at = data.get('expires_at')
+		expires_at = expires_at / 1000 if expires_at else time.time() + DEFAULT_TOKEN_LIFETIME_SECONDS
+		return data['access_token'], expires_at
+
+	def get(self):
+		if self._token and time.time() < self._expires_at - self.refresh_margin:
+			return self._token
+		with self._lock:
+			if not self._token or time.time() >= self._expires_at - self.refresh_margin:
+				self._token, self._expires_at = self._fetch()
+				logger.info("Refreshed GigaChat access token")
+			return self._token
+
+	def invalidate(self, token):
+		with self._lock:
+			if self._token == token:
+				self._token = None
+				self._expires_at = 0.0
+
 
-		payload = json.dumps(promt_sber)
+class SberSwearingGenerator():
+	def __init__(self, token_manager=None):
+		self.token_manager = token_manager or GigaChatTokenManager()
+		return
+
+	def get_auth_token(self):
+		return self.token_manager.get()
+
+	def _complete(self, question, access_token):
 		headers = {
 			'Content-Type': 'application/json',
 			'Accept': 'application/json',
 			'Authorization': f'Bearer {access_token}',
 		}
-		try:
-			response = requests.request("POST", completion_url, headers=headers, data=payload, verify=True)
-		except Exception:
-			time.sleep(10)
-			return ""
+		return get_session().post(COMPLETION_URL, headers=headers, data=_build_payload(question), verify=True, timeout=http_timeout())
+
+	def _request(self, question):
+		access_token = self.get_auth_token()
+		response = self._complete(question, access_token)
+		if response.status_code == 401:
+			# Revoked or expired early: one retry with a fresh token
+			self.token_manager.invalidate(access_token)
+			response = self._complete(question, self.get_auth_token())
 		if response.status_code != 200:
-			time.sleep(10)
-			logger.info(f"ERROR:{response.status_code} {response.reason}\n")
-			return ""
-		return json.loads(response.text)['choices'][0]['message']['content']
+			raise RuntimeError(f"ERROR:{response.status_code} {response.reason}")
+		return response.json()['choices'][0]['message']['content']
 
+	def get_answer(self, question):
+		try:
+			return breaker("gigachat").call(self._request, question)
+		except Exception as e:
+			logger.warning(f"GigaChat request failed: {e}")
+			return ""
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from timer_queue import DispatchStats
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_IO_WORKERS = 8
+DEFAULT_TTS_WORKERS = 1
+
+
+class SendExecutor:
+    """Runs periodic sends concurrently while keeping every chat serial.
+
+    Sends (LLM calls, NewsAPI, Telegram requests) run on an I/O thread pool,
+    so one slow news post no longer delays other chats. Jobs of a chat that
+    already has a send in flight wait in a per-chat backlog and start when
+    the previous one finishes. Voice synthesis goes through ``run_tts`` on a
+    separate, smaller pool so CPU-heavy Silero inference cannot occupy every
+    I/O worker.
+    """
+
+    def __init__(self, io_workers: int = DEFAULT_IO_WORKERS, tts_workers: int = DEFAULT_TTS_WORKERS):
+        self._io_pool = ThreadPoolExecutor(max_workers=max(1, int(io_workers)), thread_name_prefix="send")
+        self._tts_pool = ThreadPoolExecutor(max_workers=max(1, int(tts_workers)), thread_name_prefix="tts")
+        self._lock = threading.Lock()
+        self._backlogs: dict[object, deque] = {}
+        self._queued = 0
+        self._running = 0
+        self._tts_pending = 0
+        self._stats = DispatchStats()
+
+    def submit(self, chat_id, fn, *args, **kwargs) -> None:
+        job = (time.monotonic(), fn, args, kwargs)
+        with self._lock:
+            self._queued += 1
+            backlog = self._backlogs.get(chat_id)
+            if backlog is not None:
+                # A send for this chat is already in flight; run after it.
+                backlog.append(job)
+                return
+            self._backlogs[chat_id] = deque()
+        self._io_pool.submit(self._run, chat_id, job)
+
+    def _run(self, chat_id, job):
+        submitted_at, fn, args, kwargs = job
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._stats.record(time.monotonic() - submitted_at)
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Send job {getattr(fn, '__name__', fn)} failed for chat {chat_id}: {e}")
+        finally:
+            with self._lock:
+                self._running -= 1
+                backlog = self._backlogs[chat_id]
+                if backlog:
+                    next_job = backlog.popleft()
+                else:
+                    del self._backlogs[chat_id]
+                    next_job = None
+            if next_job is not None:
+                self._io_pool.submit(self._run, chat_id, next_job)
+
+    def run_tts(self, fn, *args, **kwargs):
+        """Run ``fn`` on the TTS pool and wait for its result."""
+        with self._lock:
+            self._tts_pending += 1
+        try:
+            return self._tts_pool.submit(fn, *args, **kwargs).result()
+        finally:
+            with self._lock:
+                self._tts_pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = self._stats.as_dict()
+            stats.update(
+                queued=self._queued,
+                running=self._running,
+                chats_in_flight=len(self._backlogs),
+                tts_pending=self._tts_pending,
+            )
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._io_pool.shutdown(wait=wait, cancel_futures=not wait)
+        self._tts_pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,115 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# start: seconds since the run began; duration: seconds the stage took
+StageTiming = namedtuple("StageTiming", ["start", "duration"])
+GraphRun = namedtuple("GraphRun", ["results", "timings", "total"])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _shared_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, Config.PIPELINE_WORKERS), thread_name_prefix="stage")
+        return _executor
+
+
+class StageGraph:
+    """Small dependency graph of pipeline stages (LLM calls, HTTP fetches).
+
+    ``add(name, fn, *deps)`` registers a stage that is called with the
+    results of its dependencies as keyword arguments; dependencies are either
+    stages added before it or inputs passed to ``run``. Every stage starts as
+    soon as its dependencies are done, so independent stages overlap and a
+    run takes as long as its critical path. ``run`` uses a shared thread pool
+    (``PIPELINE_WORKERS``), ``arun`` expects coroutine functions and runs
+    them as tasks on the current loop. Both return the results of all stages
+    together with per-stage timings, which are also logged.
+    """
+
+    def __init__(self, name, inputs=()):
+        self.name = name
+        self.inputs = set(inputs)
+        self.stages = {}
+
+    def add(self, name, fn, *deps) -> "StageGraph":
+        unknown = [dep for dep in deps if dep not in self.stages and dep not in self.inputs]
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {', '.join(unknown)}")
+        self.stages[name] = (fn, deps)
+        return self
+
+    def _finish(self, results, timings, started) -> GraphRun:
+        total = time.monotonic() - started
+        summary = ", ".join(f"{name} {timing.duration:.2f}s" for name, timing in timings.items())
+        logger.info(f"{self.name}: {summary}; total {total:.2f}s")
+        return GraphRun(results, timings, total)
+
+    def run(self, executor=None, **inputs) -> GraphRun:
+        executor = executor or _shared_executor()
+        started = time.monotonic()
+        results = dict(inputs)
+        timings = {}
+        waiting = [name for name in self.stages if name not in results]
+        running = {}
+
+        def call(name, fn, kwargs):
+            stage_started = time.monotonic()
+            result = fn(**kwargs)
+            return result, StageTiming(stage_started - started, time.monotonic() - stage_started)
+
+        try:
+            while waiting or running:
+                for name in list(waiting):
+                    fn, deps = self.stages[name]
+                    if all(dep in results for dep in deps):
+                        waiting.remove(name)
+                        kwargs = {dep: results[dep] for dep in deps}
+                        # Stages inherit the caller's context (e.g. its deadline)
+                        running[executor.submit(contextvars.copy_context().run, call, name, fn, kwargs)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name], timings[name] = future.result()
+        except Exception:
+            for future in running:
+                future.cancel()
+            raise
+        return self._finish(results, timings, started)
+
+    async def arun(self, **inputs) -> GraphRun:
+        started = time.monotonic()
+        results = dict(inputs)
+        timings = {}
+        tasks = {}
+
+        async def call(name, fn, deps):
+            kwargs = {dep: results[dep] if dep in inputs else await tasks[dep] for dep in deps}
+            stage_started = time.monotonic()
+            result = await fn(**kwargs)
+            timings[name] = StageTiming(stage_started - started, time.monotonic() - stage_started)
+            return result
+
+        for name, (fn, deps) in self.stages.items():
+            if name not in inputs:
+                tasks[name] = asyncio.ensure_future(call(name, fn, deps))
+        try:
+            for name, task in tasks.items():
+                results[name] = await task
+        except Exception:
+            for task in tasks.values():
+                task.cancel()
+            raise
+        return self._finish(results, timings, started)
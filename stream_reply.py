@@ -0,0 +1,129 @@
+import logging
+import time
+
+from telebot.apihelper import ApiTelegramException
+
+from outbound import PRIORITY_PERIODIC
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EDIT_INTERVAL = 1.0
+
+
+class EmptyStreamError(Exception):
+    """The stream ended without any text, so nothing was sent."""
+
+
+class TextStream:
+    """Marks a generator result as an iterator of text chunks to be sent progressively."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+def balance_markdown_v2(text):
+    """Make escaped, possibly cut-off MarkdownV2 parseable.
+
+    A stream can stop between the two ``*`` of a bold span or right after a
+    backslash; the unmatched ``*`` is dropped (the span turns bold once the
+    closing one arrives) and a dangling backslash is removed.
+    """
+    if text.endswith("\\") and (len(text) - len(text.rstrip("\\"))) % 2:
+        text = text[:-1]
+    stars = []
+    i = 0
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == "*":
+            stars.append(i)
+        i += 1
+    if len(stars) % 2:
+        text = text[:stars[-1]] + text[stars[-1] + 1:]
+    return text
+
+
+def _not_modified(e):
+    return "message is not modified" in str(e)
+
+
+class StreamingReply:
+    """Posts a streamed LLM answer as one message that grows while tokens arrive.
+
+    The first non-empty chunk is sent as a new message; later text is pushed
+    with ``edit_message_text`` through the outbound dispatcher at most once per
+    ``edit_interval`` seconds, and never while the previous edit is still
+    queued, so a fast stream cannot flood the chat's rate limit. Every frame
+    is escaped with ``escape`` and balanced to stay valid MarkdownV2. ``send``
+    returns the sent message and the full text, or raises ``EmptyStreamError``
+    when the stream produced no text.
+    """
+
+    def __init__(self, bot, outbound, chat_id, escape, edit_interval=DEFAULT_EDIT_INTERVAL, on_sent=None):
+        self.bot = bot
+        self.outbound = outbound
+        self.chat_id = chat_id
+        self.escape = escape
+        self.edit_interval = edit_interval
+        self.on_sent = on_sent
+        self.message = None
+        self._shown = ""
+        self._pending = None
+        self._last_edit = 0.0
+
+    def _render(self, text):
+        return balance_markdown_v2(self.escape(text))
+
+    def _edit(self, frame):
+        self._last_edit = time.monotonic()
+        self._shown = frame
+        self._pending = self.outbound.submit(
+            self.chat_id, self.bot.edit_message_text, frame, self.chat_id, self.message.message_id,
+            parse_mode='MarkdownV2', priority=PRIORITY_PERIODIC,
+        )
+
+    def _wait_pending(self):
+        if self._pending is None:
+            return
+        try:
+            self._pending.result()
+        except ApiTelegramException as e:
+            if not _not_modified(e):
+                logger.warning(f"Failed to update streamed message in chat {self.chat_id}: {e}")
+        self._pending = None
+
+    def send(self, chunks):
+        text = ""
+        for chunk in chunks:
+            text += chunk or ""
+            if not text.strip():
+                continue
+            frame = self._render(text)
+            if self.message is None:
+                self.message = self.outbound.call(
+                    self.chat_id, self.bot.send_message, self.chat_id, frame, parse_mode='MarkdownV2',
+                    priority=PRIORITY_PERIODIC,
+                )
+                self._shown = frame
+                self._last_edit = time.monotonic()
+                if self.on_sent:
+                    self.on_sent(self.message)
+                continue
+            if self._pending is not None and not self._pending.done():
+                continue
+            if time.monotonic() - self._last_edit >= self.edit_interval and frame != self._shown:
+                self._wait_pending()
+                self._edit(frame)
+
+        if self.message is None:
+            raise EmptyStreamError(f"Streamed reply for chat {self.chat_id} is empty")
+        self._wait_pending()
+        frame = self._render(text)
+        if frame != self._shown:
+            self._edit(frame)
+            self._wait_pending()
+        return self.message, text
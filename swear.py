@@ -1,20 +1,54 @@
 import telebot
 from telebot.apihelper import ApiTelegramException
-import schedule
 import time
 import random
 import threading
 import logging
-import json
-from pathlib import Path
+import atexit
 from config import Config
 from converstion_complete import Colocutor
-from swearing_gen import SwearingGenerator
+from swearing_gen import SwearingGenerator, clean_swear
+from sber_swearing_gen import SberSwearingGenerator
+from swear_router import HedgedSwearRouter
 from news_post_gen import NewsPostGenerator
-from news_post_gen_v2 import NewsPostGenerator_v2
+from news_post_gen_v2 import NewsPostGenerator_v2, news_cache
 #from voice_gen import generate_audio, get_all_voices
-from tts_gen import TTSGenerator
-import re
+from tts_service import TTSWorkerPool
+from timer_queue import TimerQueue
+from send_executor import SendExecutor
+from webhook_server import WebhookServer
+from outbound import OutboundDispatcher, PRIORITY_REPLY
+from swear_prefetch import PreparedMessage, SwearPrefetchPool
+from http_clients import close_all as close_http_clients
+from llm_cache import response_cache
+from stream_reply import StreamingReply, TextStream
+from resilience import breaker_stats, deadline, run_with_deadline, send_deadline
+from bot_state import (
+    add_conversation,
+    chat_active_modes,
+    chat_prompts,
+    chats_conversations,
+    create_tts,
+    escape_markdown_v2,
+    forget_bot_message,
+    forget_bot_messages,
+    get_random_voice,
+    open_message_history,
+    prune_tracked_messages,
+    reminder_generator,
+    roll_voice,
+    topic_extractor,
+    track_bot_message,
+    tracked_message_ids,
+    voice_prewarm_phrases,
+    NEWS_PERIOD,
+    REMINDER_PERIOD,
+    SWEAR_PERIOD,
+    TALK_PERIOD,
+    CLEANUP_STATUS_TTL_SECONDS,
+    TELEGRAM_DELETE_MESSAGES_LIMIT,
+    VOICE_PROBABILITY,
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -24,251 +58,136 @@ logger = logging.getLogger(__name__)
 bot = telebot.TeleBot(Config.TELEGRAM_BOT_TOKEN)
 # voices = get_all_voices()
 # logger.info(voices)
-sample_rate = 48000
-tts = TTSGenerator(sample_rate)
+tts, voice_cache = create_tts()
 silero_voices = tts.get_all_voices()
 logger.info(silero_voices)
 
-
-def get_random_voice(voices):
-    return voices[random.randint(0, len(voices)-1)]
-
 swearing_generator = SwearingGenerator()
+swear_backends = {}
+if "openai" in Config.SWEAR_BACKENDS:
+    swear_backends["openai"] = swearing_generator
+if "gigachat" in Config.SWEAR_BACKENDS and Config.GIGA_CHAT_AUTH:
+    swear_backends["gigachat"] = SberSwearingGenerator()
+# Sends each swear to the fastest healthy backend and hedges to the next one when it lags
+swear_router = HedgedSwearRouter(
+    swear_backends or {"openai": swearing_generator},
+    validate=clean_swear,
+    hedge_min_delay=Config.HEDGE_MIN_DELAY_MS / 1000,
+    hedge_max_delay=Config.HEDGE_MAX_DELAY_MS / 1000,
+)
 colocutor = Colocutor()
-news_post_creator = NewsPostGenerator_v2()
-
-
-STACK_SIZE = 16
-
-#SWEAR_PROMPT = Config.SWEAR_PROMPT # "Обзови Алису. Пол: Женский. Возраст: 20 лет."
-
-SWEAR_PERIOD = (90,180)
-REMINDER_PERIOD = (90*60, 180*60)
-#REMINDER_PERIOD = (2, 4)
-TALK_PERIOD = (15*60,240*60)
-NEWS_PERIOD = (180*60,360*60)
-#NEWS_PERIOD = (2,10)
-BOT_MESSAGE_HISTORY_FILE = Path(__file__).with_name("bot_message_history.json")
-BOT_MESSAGE_RETENTION_SECONDS = 48 * 60 * 60
-CLEANUP_STATUS_TTL_SECONDS = 10
-MAX_TRACKED_MESSAGES_PER_CHAT = 5000
-TELEGRAM_DELETE_MESSAGES_LIMIT = 100
-
-
-def escape_markdown_v2(text):
-    # Characters that need escaping
-    special_chars = r'_[]()~`>#+=|{}.!-'  # Added '-' to the list
-
-    def escape_char(c):
-        return '\\' + c if c in special_chars else c
-
-    def handle_formatting(text):
-        # Handle bold (asterisks)
-        text = re.sub(r'\*\*(.+?)\*\*', r'*\1*', text)  # Replace ** with *
-        text = re.sub(r'(?<!\\)\*(.+?)(?<!\\)\*', r'*\1*', text)  # Keep single * as is
-
-        # Handle italic (underscores)
-        text = re.sub(r'(?<!\\)_(.+?)(?<!\\)_', r'*\1*', text)  # Replace _ with *
-
-        return text
-
-    # First, handle formatting (bold and italic)
-    text = handle_formatting(text)
-
-    # Then escape special characters, preserving existing escapes
-    result = []
-    i = 0
-    while i < len(text):
-        if text[i] == '\\' and i + 1 < len(text) and text[i+1] in f"{special_chars}*":
-            result.append(text[i:i+2])  # Keep existing escapes
-            i += 2
-        elif text[i] == '*':
-            result.append('*')  # Keep * for formatting
-            i += 1
-        elif text[i] in special_chars:
-            result.append('\\' + text[i])  # Escape special chars
-            i += 1
-        else:
-            result.append(text[i])  # Regular character
-            i += 1
-
-    return ''.join(result)
-
-def _normalize_tracked_messages(raw_messages):
-    now = time.time()
-    normalized = []
-    if not isinstance(raw_messages, list):
-        return normalized
-
-    for item in raw_messages:
-        if isinstance(item, dict):
-            message_id = item.get("message_id")
-            sent_at = item.get("sent_at", now)
-        else:
-            message_id = item
-            sent_at = now
-
-        if not isinstance(message_id, int):
-            continue
-
-        try:
-            sent_at = float(sent_at)
-        except (TypeError, ValueError):
-            sent_at = now
-
-        if now - sent_at <= BOT_MESSAGE_RETENTION_SECONDS:
-            normalized.append({"message_id": message_id, "sent_at": sent_at})
-
-    return normalized[-MAX_TRACKED_MESSAGES_PER_CHAT:]
+news_post_creator = NewsPostGenerator_v2(colocutor)
 
-def _load_bot_message_history():
-    if not BOT_MESSAGE_HISTORY_FILE.exists():
-        return {}
-
-    try:
-        raw_history = json.loads(BOT_MESSAGE_HISTORY_FILE.read_text(encoding="utf-8"))
-    except (OSError, json.JSONDecodeError) as e:
-        logger.warning(f"Unable to load bot message history: {e}")
-        return {}
-
-    if not isinstance(raw_history, dict):
-        return {}
-
-    history = {}
-    for chat_id, messages in raw_history.items():
-        normalized = _normalize_tracked_messages(messages)
-        if normalized:
-            history[str(chat_id)] = normalized
-
-    return history
-
-def _save_bot_message_history():
-    try:
-        BOT_MESSAGE_HISTORY_FILE.write_text(
-            json.dumps(bot_message_history, ensure_ascii=False, indent=2),
-            encoding="utf-8",
-        )
-    except OSError as e:
-        logger.error(f"Unable to save bot message history: {e}")
-
-def _prune_tracked_messages(chat_id):
-    chat_key = str(chat_id)
-    pruned = _normalize_tracked_messages(bot_message_history.get(chat_key, []))
-    if pruned:
-        bot_message_history[chat_key] = pruned
-    else:
-        bot_message_history.pop(chat_key, None)
-
-def track_bot_message(message):
-    if message is None:
-        return message
-
-    chat = getattr(message, "chat", None)
-    chat_id = getattr(chat, "id", None)
-    message_id = getattr(message, "message_id", None)
-    if chat_id is None or message_id is None:
-        return message
-
-    with bot_message_history_lock:
-        chat_key = str(chat_id)
-        bot_message_history.setdefault(chat_key, []).append(
-            {"message_id": message_id, "sent_at": time.time()}
-        )
-        _prune_tracked_messages(chat_id)
-        _save_bot_message_history()
-
-    return message
-
-def forget_bot_message(chat_id, message_id):
-    forget_bot_messages(chat_id, [message_id])
-
-def forget_bot_messages(chat_id, message_ids):
-    message_ids = set(message_ids)
-    with bot_message_history_lock:
-        chat_key = str(chat_id)
-        messages = bot_message_history.get(chat_key, [])
-        messages = [item for item in messages if item["message_id"] not in message_ids]
-        if messages:
-            bot_message_history[chat_key] = messages
-        else:
-            bot_message_history.pop(chat_key, None)
-        _save_bot_message_history()
+SCHEDULER_STATS_INTERVAL = 10 * 60
 
 def send_tracked_message(chat_id, *args, **kwargs):
-    return track_bot_message(bot.send_message(chat_id, *args, **kwargs))
+    return track_bot_message(outbound.call(chat_id, bot.send_message, chat_id, *args, priority=PRIORITY_REPLY, **kwargs))
 
 def reply_tracked_message(message, *args, **kwargs):
-    return track_bot_message(bot.reply_to(message, *args, **kwargs))
+    return track_bot_message(outbound.call(message.chat.id, bot.reply_to, message, *args, priority=PRIORITY_REPLY, **kwargs))
 
 def send_tracked_voice(chat_id, *args, **kwargs):
-    return track_bot_message(bot.send_voice(chat_id, *args, **kwargs))
+    return track_bot_message(outbound.call(chat_id, bot.send_voice, chat_id, *args, **kwargs))
 
 def delete_tracked_message(chat_id, message_id):
-    try:
-        bot.delete_message(chat_id, message_id)
+    if outbound.delete(chat_id, message_id).result():
         forget_bot_message(chat_id, message_id)
         return True
-    except ApiTelegramException as e:
-        logger.warning(f"Failed to delete bot message {message_id} in chat {chat_id}: {e}")
-        return False
+    return False
 
 def delete_tracked_message_later(chat_id, message_id, delay_seconds):
-    timer = threading.Timer(delay_seconds, delete_tracked_message, args=(chat_id, message_id))
-    timer.daemon = True
-    timer.start()
+    return timer_queue.call_later(delay_seconds, delete_tracked_message, chat_id, message_id)
 
 def cleanup_tracked_bot_messages(chat_id):
-    with bot_message_history_lock:
-        _prune_tracked_messages(chat_id)
-        messages = list(bot_message_history.get(str(chat_id), []))
-
-    cleared = 0
-    failed = 0
-    message_ids = [item["message_id"] for item in messages]
-
-    for index in range(0, len(message_ids), TELEGRAM_DELETE_MESSAGES_LIMIT):
-        batch = message_ids[index:index + TELEGRAM_DELETE_MESSAGES_LIMIT]
-        try:
-            bot.delete_messages(chat_id, batch)
-            forget_bot_messages(chat_id, batch)
-            cleared += len(batch)
-        except ApiTelegramException as e:
-            logger.warning(f"Bulk delete failed for chat {chat_id}: {e}")
-            for message_id in batch:
-                if delete_tracked_message(chat_id, message_id):
-                    cleared += 1
-                else:
-                    failed += 1
-
-    with bot_message_history_lock:
-        _prune_tracked_messages(chat_id)
-        _save_bot_message_history()
-
-    return cleared, failed
-
-bot_message_history_lock = threading.Lock()
-bot_message_history = _load_bot_message_history()
+    message_ids = tracked_message_ids(chat_id)
+
+    # The dispatcher coalesces these into delete_messages batches and falls back to single deletes
+    pending = [(message_id, outbound.delete(chat_id, message_id)) for message_id in message_ids]
+    deleted = [message_id for message_id, future in pending if future.result()]
+    forget_bot_messages(chat_id, deleted)
+
+    prune_tracked_messages(chat_id)
+
+    return len(deleted), len(message_ids) - len(deleted)
+
+open_message_history()
+atexit.register(close_http_clients)
+atexit.register(response_cache.save)
+
+# Every chat-changing Bot API call goes through one rate-limited dispatcher
+outbound = OutboundDispatcher(
+    bot,
+    global_rate=Config.TELEGRAM_GLOBAL_RATE,
+    chat_rate=Config.TELEGRAM_CHAT_RATE,
+    chat_burst=Config.TELEGRAM_CHAT_BURST,
+    max_retries=Config.TELEGRAM_MAX_RETRIES,
+    workers=Config.OUTBOUND_WORKERS,
+    delete_batch=TELEGRAM_DELETE_MESSAGES_LIMIT,
+).start()
+
+# Delayed actions (auto-deletes, retries) share one timer thread and a small worker pool
+timer_queue = TimerQueue(max_workers=Config.TIMER_QUEUE_WORKERS, name="delayed-actions").start()
+# The periodic scheduler only hands due sends over to the executor, so one dispatch thread is enough
+periodic_scheduler = TimerQueue(max_workers=1, name="periodic-senders")
+# Enough TTS threads to keep every worker process busy
+send_executor = SendExecutor(io_workers=Config.SEND_WORKERS, tts_workers=max(Config.TTS_WORKERS, Config.TTS_PROCESSES))
 
 class PeriodicMessageSender:
-    def __init__(self, chat_id, bot, message_generator, voice_generator, sending_interval_range):
+    def __init__(self, chat_id, bot, message_generator, voice_generator, sending_interval_range, scheduler=None, executor=None):
         self.chat_id = chat_id
         self.bot = bot
         self.message_generator = message_generator
         self.voice_generator = voice_generator
         self.sending_interval_range = sending_interval_range
+        self.scheduler = scheduler or periodic_scheduler
+        self.executor = executor or send_executor
         self.active = False
         self.job = None
 
+    def generate_message(self, seconds):
+        # A slow or unavailable dependency must not hold the chat: fall back to a static phrase
+        try:
+            # One deadline pool per generator: calls stuck on a hung dependency cannot starve other modes
+            return run_with_deadline(seconds, self.message_generator, self, pool=self.message_generator.__name__)
+        except Exception as e:
+            logger.warning(f"Message generation failed for chat {self.chat_id}, sending a fallback: {e}")
+            return fallback_generator(self)
+
+    def send_stream(self, stream, seconds):
+        reply = StreamingReply(self.bot, outbound, self.chat_id, escape_markdown_v2,
+                               Config.STREAM_EDIT_INTERVAL_MS / 1000, on_sent=track_bot_message)
+        try:
+            with deadline(seconds):
+                return reply.send(stream)[1]
+        except Exception as e:
+            if reply.message is not None:
+                raise
+            logger.warning(f"Streaming failed for chat {self.chat_id}, sending a fallback: {e}")
+            message = fallback_generator(self)
+            track_bot_message(outbound.call(self.chat_id, self.bot.send_message, self.chat_id, escape_markdown_v2(message), parse_mode='MarkdownV2'))
+            return message
+
     def send_message(self):
         if not self.active:
             return
         try:
-            message = self.message_generator(self)
-            track_bot_message(self.bot.send_message(self.chat_id, escape_markdown_v2(message), parse_mode='MarkdownV2'))
-            if self.voice_generator and random.randint(0, 9) >= 7:
-                voice = self.voice_generator(self, message)
-                if voice is not None:
-                    track_bot_message(self.bot.send_voice(self.chat_id, voice))
+            seconds = send_deadline(self.sending_interval_range)
+            message = self.generate_message(seconds)
+            if message is None:
+                logger.info(f"Nothing to send to chat {self.chat_id} this time")
+                return
+            prepared = isinstance(message, PreparedMessage)
+            voice = None
+            if prepared:
+                message, voice = message
+            if isinstance(message, TextStream):
+                message = self.send_stream(message, seconds)
+            else:
+                track_bot_message(outbound.call(self.chat_id, self.bot.send_message, self.chat_id, escape_markdown_v2(message), parse_mode='MarkdownV2'))
+            if not prepared and self.voice_generator and roll_voice():
+                voice = self.executor.run_tts(self.voice_generator, self, message)
+            if voice is not None:
+                track_bot_message(outbound.call(self.chat_id, self.bot.send_voice, self.chat_id, voice))
             logger.info(f"Sent message {message} to chat {self.chat_id}")
         except ApiTelegramException as e:
             logger.error(f"Failed to send message to chat {self.chat_id}: {e}")
@@ -279,10 +198,10 @@ class PeriodicMessageSender:
 
     def schedule_next_message(self):
         if self.job:
-            schedule.cancel_job(self.job)
-        
+            self.job.cancel()
+
         interval = random.randint(*self.sending_interval_range)
-        self.job = schedule.every(interval).seconds.do(self.send_message)
+        self.job = self.scheduler.call_later(interval, self.executor.submit, self.chat_id, self.send_message)
         logger.info(f"Scheduled new job for chat {self.chat_id} with {interval} seconds interval")
 
     def start(self):
@@ -295,18 +214,17 @@ class PeriodicMessageSender:
         if self.active:
             self.active = False
             if self.job:
-                schedule.cancel_job(self.job)
+                self.job.cancel()
             logger.info(f"Stopped periodic messages for chat {self.chat_id}")
 
 # Message generators
 def swear_generator(sender):
     chat_id = sender.chat_id
     prompt = chat_prompts.get(chat_id, Config.SWEAR_PROMPT)
-    return swearing_generator.get_answer(prompt)
+    return swear_prefetch.get(prompt)
 
-def reminder_generator(sender):
-    sentences = ["_Вертится_ __что-то__ на **языке**...", "**Эх**х....", "~Поругаемся~ может?", "Ну *что*?"]
-    return sentences[random.randint(0, len(sentences)-1)]
+# Sent when the real generator misses its deadline or its dependency is down
+fallback_generator = reminder_generator
 
 #def voice_generator(sender, sentence):
 #    voice_id = get_random_voice(voices)
@@ -321,11 +239,40 @@ def silero_voice_generator(sender, sentence):
         logger.error(f"Voice generation failed for chat {sender.chat_id}: {e}")
         return None
 
+def prefetch_voice(sentence):
+    voice_id = get_random_voice(silero_voices)
+    return send_executor.run_tts(tts.generate_voice, text=sentence, speaker=voice_id).getvalue()
+
+def prewarm_voice_cache():
+    phrases = voice_prewarm_phrases()
+    # One phrase per TTS job, so live voice messages are not stuck behind the whole list
+    for phrase in phrases:
+        send_executor.run_tts(tts.prewarm, [phrase])
+    logger.info(f"Voice cache prewarm finished for {len(phrases)} phrases")
+
+def start_voice_prewarm():
+    if Config.VOICE_CACHE_PREWARM:
+        threading.Thread(target=prewarm_voice_cache, name="voice-prewarm", daemon=True).start()
+
+# Swears are prepared ahead of time per target prompt, voice included when the roll wins
+swear_prefetch = SwearPrefetchPool(
+    swear_router.get_answer,
+    generate_batch=swear_router.get_answers,
+    synthesize=prefetch_voice,
+    size=Config.SWEAR_PREFETCH_SIZE,
+    low_water=Config.SWEAR_PREFETCH_LOW_WATER,
+    voice_probability=VOICE_PROBABILITY,
+)
+
 def talk_generator(sender):
     chat_id = sender.chat_id
     conversations = []
     if chat_id in chats_conversations:
         conversations = chats_conversations[chat_id]
+    if Config.TALK_STREAMING:
+        if colocutor.already_answered(conversations):
+            return None
+        return TextStream(colocutor.stream_answer(list(conversations)))
     return colocutor.get_answer(conversations)
 
 def news_post_generator(sender):
@@ -333,15 +280,12 @@ def news_post_generator(sender):
     conversations = []
     if chat_id in chats_conversations:
         conversations = chats_conversations[chat_id]
-    return news_post_creator.get_answer(conversations)
+    topic, confidence = topic_extractor.topic(chat_id)
+    logger.info(f"Local news topic for chat {chat_id}: {topic} (confidence {confidence:.2f})")
+    return news_post_creator.get_answer(conversations, topic=topic)
 
 # Dictionary to store PeriodicMessageSender instances
 chat_senders = {}
-chats_conversations = {}
-# Словарь для хранения промптов для каждого чата
-chat_prompts = {}
-# Словарь для хранения активного режима каждого чата
-chat_active_modes = {}
 
 def start_stop(command, senders, chat_id):
     try:
@@ -400,7 +344,11 @@ def process_person_step(message):
     person = message.text.strip()
 
     # Сохраняем промпт для данного чатаs
+    previous_prompt = chat_prompts.get(chat_id)
     chat_prompts[chat_id] = f"Обзови {person}."
+    if previous_prompt and previous_prompt not in chat_prompts.values():
+        swear_prefetch.invalidate(previous_prompt)
+    swear_prefetch.warm(chat_prompts[chat_id])
 
     reply_tracked_message(message, f"Хорошо, теперь буду оскорблять {person}.")
 
@@ -427,12 +375,6 @@ def cleanup_command(message):
     status_message = send_tracked_message(chat_id, status_text)
     delete_tracked_message_later(chat_id, status_message.message_id, CLEANUP_STATUS_TTL_SECONDS)
 
-def add_conversation(conversations, conversation):
-    conversations.append(conversation)
-    if len(conversations) > STACK_SIZE:
-        conversations.pop(0)
-    logger.info(conversations)
-
 @bot.message_handler(func=lambda message: True)
 def handle_message(message):
     if message.from_user.id == bot.get_me().id:
@@ -440,20 +382,64 @@ def handle_message(message):
     # Check if the message is sent by the bot itself
     chat_id = message.chat.id
     if chat_id in chats_conversations:
-        add_conversation(chats_conversations[chat_id], message.text)
+        add_conversation(chats_conversations[chat_id], message.text, chat_id)
         logger.info(f'Added message to conversation for chat {chat_id}: {chats_conversations[chat_id]}')
     else:
         chats_conversations[chat_id] = [message.text]
+        topic_extractor.add(chat_id, message.text)
         logger.info(f'New conversation for chat {chat_id}: {chats_conversations[chat_id]}')
 
-def schedule_checker():
-    while True:
-        try:
-            schedule.run_pending()
-            time.sleep(1)
-        except Exception as e:
-            logger.error(f"Error in schedule checker: {e}")
-            time.sleep(5)  # Wait a bit longer before retrying if there's an error
+def log_scheduler_stats():
+    stats = periodic_scheduler.stats()
+    logger.info(
+        f"Periodic scheduler: {stats['pending']} pending jobs, {stats['dispatched']} dispatched, "
+        f"lag avg {stats['lag_avg']:.3f}s, max {stats['lag_max']:.3f}s, last {stats['lag_last']:.3f}s"
+    )
+    stats = send_executor.stats()
+    logger.info(
+        f"Send executor: {stats['running']} running, {stats['queued']} queued, "
+        f"{stats['chats_in_flight']} chats in flight, {stats['tts_pending']} TTS pending, "
+        f"lag avg {stats['lag_avg']:.3f}s, max {stats['lag_max']:.3f}s"
+    )
+    stats = outbound.stats()
+    logger.info(
+        f"Outbound queue: {stats['queued']} calls in {stats['chats']} chats, "
+        f"{stats['pending_deletes']} deletes pending"
+    )
+    stats = response_cache.stats()
+    logger.info(
+        f"LLM cache: {stats['entries']} entries, {stats['hits']} hits, {stats['misses']} misses, "
+        f"hit rate {stats['hit_rate']:.0%}"
+    )
+    # Writing JSON to disk must not hold up the scheduler's only dispatch thread
+    timer_queue.call_later(0, response_cache.save)
+    for name, circuit in breaker_stats().items():
+        logger.info(f"Circuit {name}: {circuit['state']}, {circuit['failures']} failures, {circuit['rejected']} rejected calls")
+    for name, backend_stats in swear_router.stats().items():
+        p95 = backend_stats['p95']
+        logger.info(
+            f"Swear backend {name}: {backend_stats['calls']} calls, {backend_stats['wins']} wins, "
+            f"error rate {backend_stats['error_rate']:.0%}, p95 {p95 if p95 is None else round(p95, 2)}s"
+        )
+    if voice_cache is not None:
+        stats = voice_cache.stats()
+        logger.info(
+            f"Voice cache: {stats['entries']} in memory, {stats['disk_entries']} on disk "
+            f"({stats['disk_bytes'] / 1e6:.1f} MB), {stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, "
+            f"{stats['misses']} misses, hit rate {stats['hit_rate']:.0%}"
+        )
+    if isinstance(tts, TTSWorkerPool):
+        stats = tts.stats()
+        logger.info(
+            f"TTS workers: {stats['busy']}/{stats['processes']} busy, {stats['requests']} requests, "
+            f"{stats['restarts']} restarts"
+        )
+    stats = news_cache.stats()
+    logger.info(
+        f"News cache: {stats['topics']} topics, {stats['hits']} hits, {stats['stale_hits']} stale, "
+        f"{stats['misses']} misses, {stats['budget_used']} NewsAPI requests in budget window"
+    )
+    periodic_scheduler.call_later(SCHEDULER_STATS_INTERVAL, log_scheduler_stats)
 
 def run_bot():
     while True:
@@ -466,6 +452,26 @@ def run_bot():
             logger.error(f"Unexpected error in bot polling: {e}")
             time.sleep(5)
 
+def run_webhook():
+    # Handlers run on the webhook workers, so the server's bounded queue is the only backlog
+    bot.threaded = False
+    server = WebhookServer(
+        bot,
+        listen=Config.TELEGRAM_WEBHOOK_LISTEN,
+        port=Config.TELEGRAM_WEBHOOK_PORT,
+        path=Config.TELEGRAM_WEBHOOK_PATH,
+        secret_token=Config.TELEGRAM_WEBHOOK_SECRET,
+        workers=Config.WEBHOOK_WORKERS,
+        queue_size=Config.WEBHOOK_QUEUE_SIZE,
+    )
+    if Config.TELEGRAM_WEBHOOK_URL:
+        bot.remove_webhook()
+        bot.set_webhook(url=Config.TELEGRAM_WEBHOOK_URL, secret_token=Config.TELEGRAM_WEBHOOK_SECRET)
+        logger.info(f"Webhook registered at {Config.TELEGRAM_WEBHOOK_URL}")
+    else:
+        logger.info("TELEGRAM_WEBHOOK_URL is not set; accepting locally posted updates only")
+    server.serve_forever()
+
 def test_escape():
     test_cases = [
     "Hello *world*",
@@ -491,10 +497,13 @@ def test_escape():
         logger.info()
 
 if __name__ == "__main__":
-    # Start the schedule checker in a separate thread
-
-    checker_thread = threading.Thread(target=schedule_checker)
-    checker_thread.start()
+    # Start the periodic senders' scheduler; it sleeps until the next due job
+    periodic_scheduler.start()
+    periodic_scheduler.call_later(SCHEDULER_STATS_INTERVAL, log_scheduler_stats)
+    start_voice_prewarm()
 
     # Start the bot
-    run_bot()
+    if Config.TELEGRAM_RUN_MODE == "webhook":
+        run_webhook()
+    else:
+        run_bot()
@@ -0,0 +1,320 @@
+"""Asyncio runtime for the bot.
+
+Same commands and modes as ``swear.py``, but Telegram handlers, the periodic
+senders, LLM generators and NewsAPI fetches are coroutines on a single event
+loop. Only Silero TTS runs on threads (a small executor), so the number of
+threads stays fixed no matter how many chats are active.
+
+Run with ``python swear_async.py``. State that does not depend on the
+runtime (conversations, prompts, tracked messages, TTS factory) comes from
+``bot_state``, so none of the threaded components of ``swear.py`` (sync bot,
+outbound dispatcher, timer queues, prefetch pools) are started here.
+"""
+import asyncio
+import atexit
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from converstion_complete import Colocutor
+from http_clients import close_all as close_http_clients
+from llm_cache import response_cache
+from news_post_gen_v2 import NewsPostGenerator_v2
+from outbound import AsyncOutboundDispatcher, PRIORITY_DELETE, PRIORITY_REPLY
+from swearing_gen import SwearingGenerator
+from bot_state import (
+    add_conversation,
+    chat_active_modes,
+    chat_prompts,
+    chats_conversations,
+    create_tts,
+    escape_markdown_v2,
+    forget_bot_message,
+    forget_bot_messages,
+    get_random_voice,
+    open_message_history,
+    prune_tracked_messages,
+    reminder_generator as static_reminder,
+    roll_voice,
+    topic_extractor,
+    track_bot_message,
+    tracked_message_ids,
+    voice_prewarm_phrases,
+    SWEAR_PERIOD,
+    REMINDER_PERIOD,
+    TALK_PERIOD,
+    NEWS_PERIOD,
+    CLEANUP_STATUS_TTL_SECONDS,
+    TELEGRAM_DELETE_MESSAGES_LIMIT,
+)
+
+try:
+    from telebot.async_telebot import AsyncTeleBot
+    from telebot.asyncio_helper import ApiTelegramException
+except ImportError as exc:
+    raise RuntimeError(
+        "The asyncio runtime needs aiohttp. Install it with `uv sync --extra async`."
+    ) from exc
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+bot = AsyncTeleBot(Config.TELEGRAM_BOT_TOKEN)
+# Every chat-changing Bot API call waits for the rate limits; started in main()
+outbound = AsyncOutboundDispatcher(
+    global_rate=Config.TELEGRAM_GLOBAL_RATE,
+    chat_rate=Config.TELEGRAM_CHAT_RATE,
+    chat_burst=Config.TELEGRAM_CHAT_BURST,
+    max_retries=Config.TELEGRAM_MAX_RETRIES,
+)
+tts_executor = ThreadPoolExecutor(max_workers=max(1, Config.TTS_WORKERS, Config.TTS_PROCESSES), thread_name_prefix="tts")
+swearing_generator = SwearingGenerator()
+colocutor = Colocutor()
+news_post_creator = NewsPostGenerator_v2(colocutor)
+# Built in main(), so importing this module does not load Silero
+tts = None
+silero_voices = []
+
+# Chats waiting for the /person answer; AsyncTeleBot has no register_next_step_handler
+awaiting_person = set()
+chat_senders = {}
+bot_user_id = None
+# Kept so the prewarm task is not garbage-collected while it runs
+prewarm_task = None
+
+
+async def send_tracked_message(chat_id, *args, **kwargs):
+    return track_bot_message(await outbound.call(chat_id, bot.send_message, chat_id, *args, priority=PRIORITY_REPLY, **kwargs))
+
+async def reply_tracked_message(message, *args, **kwargs):
+    return track_bot_message(await outbound.call(message.chat.id, bot.reply_to, message, *args, priority=PRIORITY_REPLY, **kwargs))
+
+async def delete_tracked_message(chat_id, message_id):
+    try:
+        await outbound.call(chat_id, bot.delete_message, chat_id, message_id, priority=PRIORITY_DELETE)
+        forget_bot_message(chat_id, message_id)
+        return True
+    except ApiTelegramException as e:
+        logger.warning(f"Failed to delete bot message {message_id} in chat {chat_id}: {e}")
+        return False
+
+def delete_tracked_message_later(chat_id, message_id, delay_seconds):
+    loop = asyncio.get_running_loop()
+    return loop.call_later(delay_seconds, lambda: asyncio.ensure_future(delete_tracked_message(chat_id, message_id)))
+
+async def cleanup_tracked_bot_messages(chat_id):
+    message_ids = tracked_message_ids(chat_id)
+    cleared = 0
+    failed = 0
+
+    for index in range(0, len(message_ids), TELEGRAM_DELETE_MESSAGES_LIMIT):
+        batch = message_ids[index:index + TELEGRAM_DELETE_MESSAGES_LIMIT]
+        try:
+            await outbound.call(chat_id, bot.delete_messages, chat_id, batch, priority=PRIORITY_DELETE)
+            forget_bot_messages(chat_id, batch)
+            cleared += len(batch)
+        except ApiTelegramException as e:
+            logger.warning(f"Bulk delete failed for chat {chat_id}: {e}")
+            for message_id in batch:
+                if await delete_tracked_message(chat_id, message_id):
+                    cleared += 1
+                else:
+                    failed += 1
+
+    prune_tracked_messages(chat_id)
+    return cleared, failed
+
+
+class AsyncPeriodicMessageSender:
+    """Coroutine version of ``swear.PeriodicMessageSender``: one sleeping task per active mode."""
+
+    def __init__(self, chat_id, message_generator, voice_generator, sending_interval_range):
+        self.chat_id = chat_id
+        self.message_generator = message_generator
+        self.voice_generator = voice_generator
+        self.sending_interval_range = sending_interval_range
+        self.active = False
+        self.task = None
+
+    async def send_message(self):
+        try:
+            message = await self.message_generator(self)
+            if message is None:
+                logger.info(f"Nothing to send to chat {self.chat_id} this time")
+                return
+            track_bot_message(await outbound.call(
+                self.chat_id, bot.send_message, self.chat_id, escape_markdown_v2(message), parse_mode='MarkdownV2'))
+            if self.voice_generator and roll_voice():
+                voice = await self.voice_generator(self, message)
+                if voice is not None:
+                    track_bot_message(await outbound.call(self.chat_id, bot.send_voice, self.chat_id, voice))
+            logger.info(f"Sent message {message} to chat {self.chat_id}")
+        except ApiTelegramException as e:
+            logger.error(f"Failed to send message to chat {self.chat_id}: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error when sending message to chat {self.chat_id}: {e}")
+
+    async def _run(self):
+        while self.active:
+            interval = random.randint(*self.sending_interval_range)
+            logger.info(f"Scheduled new job for chat {self.chat_id} with {interval} seconds interval")
+            await asyncio.sleep(interval)
+            if self.active:
+                await self.send_message()
+
+    def start(self):
+        if not self.active:
+            self.active = True
+            self.task = asyncio.create_task(self._run())
+            logger.info(f"Started periodic messages for chat {self.chat_id}")
+
+    def stop(self):
+        if self.active:
+            self.active = False
+            if self.task:
+                self.task.cancel()
+                self.task = None
+            logger.info(f"Stopped periodic messages for chat {self.chat_id}")
+
+
+# Message generators
+async def swear_generator(sender):
+    prompt = chat_prompts.get(sender.chat_id, Config.SWEAR_PROMPT)
+    return await swearing_generator.aget_answer(prompt)
+
+async def reminder_generator(sender):
+    return static_reminder(sender)
+
+def synthesize_voice(chat_id, sentence):
+    voice_id = get_random_voice(silero_voices)
+    logger.info(f"Generating voice with {voice_id}")
+    try:
+        return tts.generate_voice(text=sentence, speaker=voice_id)
+    except Exception as e:
+        logger.error(f"Voice generation failed for chat {chat_id}: {e}")
+        return None
+
+async def silero_voice_generator(sender, sentence):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(tts_executor, synthesize_voice, sender.chat_id, sentence)
+
+async def talk_generator(sender):
+    return await colocutor.aget_answer(chats_conversations.get(sender.chat_id, []))
+
+async def news_post_generator(sender):
+    topic, _ = topic_extractor.topic(sender.chat_id)
+    return await news_post_creator.aget_answer(chats_conversations.get(sender.chat_id, []), topic=topic)
+
+async def prewarm_voice_cache():
+    loop = asyncio.get_running_loop()
+    phrases = voice_prewarm_phrases()
+    # One phrase per TTS job, so live voice messages are not stuck behind the whole list
+    for phrase in phrases:
+        await loop.run_in_executor(tts_executor, tts.prewarm, [phrase])
+    logger.info(f"Voice cache prewarm finished for {len(phrases)} phrases")
+
+
+def start_stop(command, senders, chat_id):
+    for key, instance in senders.items():
+        if key == command:
+            if not instance.active:
+                instance.start()
+                logger.info(f"Started {key} messages for chat {chat_id}")
+        elif instance.active:
+            instance.stop()
+            logger.info(f"Stopped {key} messages for chat {chat_id}")
+
+async def ask_for_person(message):
+    awaiting_person.add(message.chat.id)
+    await reply_tracked_message(message, "Укажите, кого вы хотите поругать.")
+
+@bot.message_handler(commands=['start'])
+async def start_command(message):
+    chat_id = message.chat.id
+
+    user_name = message.from_user.username if message.from_user.username else 'Unknown'
+    chat_name = message.chat.username if message.chat.username else message.chat.title if message.chat.title else 'Unknown'
+
+    logger.info(f"Bot started for chat {chat_id}:{chat_name}. User: {user_name}.")
+    if chat_id not in chat_senders:
+        chat_senders[chat_id] = {
+            'swear': AsyncPeriodicMessageSender(chat_id, swear_generator, silero_voice_generator, SWEAR_PERIOD),
+            'pause': AsyncPeriodicMessageSender(chat_id, reminder_generator, None, REMINDER_PERIOD),
+            'talk': AsyncPeriodicMessageSender(chat_id, talk_generator, None, TALK_PERIOD),
+            'news': AsyncPeriodicMessageSender(chat_id, news_post_generator, None, NEWS_PERIOD)
+        }
+    chat_active_modes[chat_id] = "swear"
+    if chat_id not in chat_prompts:
+        await ask_for_person(message)
+    start_stop('swear', chat_senders[chat_id], chat_id)
+
+@bot.message_handler(commands=['stop', 'swear', 'pause', 'talk', 'news'])
+async def command(message):
+    command = message.text[1:]
+    chat_id = message.chat.id
+    chat_active_modes[chat_id] = command
+    if command == 'swear' and chat_id not in chat_prompts:
+        await ask_for_person(message)
+    if chat_id in chat_senders:
+        start_stop(command, chat_senders[chat_id], chat_id)
+    else:
+        logger.info(f"Messaging is not scheduled for chat {chat_id}. Command: {command}")
+
+async def process_person_step(message):
+    chat_id = message.chat.id
+    person = message.text.strip()
+    chat_prompts[chat_id] = f"Обзови {person}."
+    await reply_tracked_message(message, f"Хорошо, теперь буду оскорблять {person}.")
+
+@bot.message_handler(commands=['person'])
+async def set_person_command(message):
+    if chat_active_modes.get(message.chat.id) == 'swear':
+        await ask_for_person(message)
+    else:
+        await reply_tracked_message(message, "Команда /person доступна только в режиме 'swear'. Сначала активируйте его командой /swear.")
+
+@bot.message_handler(commands=['cleanup', 'clean'])
+async def cleanup_command(message):
+    chat_id = message.chat.id
+    cleared, failed = await cleanup_tracked_bot_messages(chat_id)
+    status_text = f"Cleanup complete. Cleared {cleared} tracked bot message(s)."
+    if failed:
+        status_text += f" Failed to delete {failed} tracked message(s)."
+    status_message = await send_tracked_message(chat_id, status_text)
+    delete_tracked_message_later(chat_id, status_message.message_id, CLEANUP_STATUS_TTL_SECONDS)
+
+@bot.message_handler(func=lambda message: True)
+async def handle_message(message):
+    if message.from_user.id == bot_user_id:
+        return
+    chat_id = message.chat.id
+    if chat_id in awaiting_person and message.text:
+        awaiting_person.discard(chat_id)
+        await process_person_step(message)
+        return
+    if chat_id in chats_conversations:
+        add_conversation(chats_conversations[chat_id], message.text, chat_id)
+    else:
+        chats_conversations[chat_id] = [message.text]
+        topic_extractor.add(chat_id, message.text)
+    logger.info(f'Updated conversation for chat {chat_id}: {chats_conversations[chat_id]}')
+
+
+async def main():
+    global bot_user_id, tts, silero_voices, prewarm_task
+    open_message_history()
+    outbound.start()
+    atexit.register(close_http_clients)
+    atexit.register(response_cache.save)
+    tts, _ = create_tts()
+    silero_voices = tts.get_all_voices()
+    logger.info(silero_voices)
+    bot_user_id = (await bot.get_me()).id
+    if Config.VOICE_CACHE_PREWARM:
+        prewarm_task = asyncio.create_task(prewarm_voice_cache())
+    await bot.infinity_polling(timeout=60)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
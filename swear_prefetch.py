@@ -0,0 +1,116 @@
+import io
+import logging
+import random
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_LOW_WATER = 2
+DEFAULT_WORKERS = 2
+
+# A message whose optional voice was already decided (and synthesized) by its generator.
+PreparedMessage = namedtuple("PreparedMessage", ["text", "voice"])
+
+
+class SwearPrefetchPool:
+    """Ready-made swears per target prompt, refilled in the background.
+
+    Each prompt (the per-chat text from ``chat_prompts``) owns a queue of up
+    to ``size`` prepared swears. The voice roll happens at prefetch time and
+    the voice is synthesized right away when it wins (``synthesize`` returns
+    encoded bytes), so ``get`` is a pop from a queue. Dropping below
+    ``low_water`` schedules a background refill; an empty queue falls back to
+    preparing one swear inline. ``invalidate`` drops a prompt's queue and
+    discards refills still running for it.
+
+    With ``generate_batch(prompt, k)`` a refill asks for all missing swears in
+    one call instead of one call per swear.
+    """
+
+    def __init__(self, generate, synthesize=None, size=DEFAULT_POOL_SIZE, low_water=DEFAULT_LOW_WATER,
+                 voice_probability=0.0, workers=DEFAULT_WORKERS, generate_batch=None):
+        self.generate = generate
+        self.generate_batch = generate_batch
+        self.synthesize = synthesize
+        self.size = max(1, int(size))
+        self.low_water = max(0, min(int(low_water), self.size - 1))
+        self.voice_probability = voice_probability
+        self._lock = threading.Lock()
+        self._pools: dict[str, deque] = {}
+        self._generations: dict[str, int] = {}
+        self._refilling: set[str] = set()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="swear-prefetch")
+
+    def _prepare(self, prompt, text=None) -> PreparedMessage:
+        if text is None:
+            text = self.generate(prompt)
+        voice = None
+        if self.synthesize and random.random() < self.voice_probability:
+            try:
+                voice = self.synthesize(text)
+            except Exception as e:
+                logger.error(f"Voice prefetch failed for '{prompt}': {e}")
+        return PreparedMessage(text, voice)
+
+    def get(self, prompt) -> PreparedMessage:
+        with self._lock:
+            pool = self._pools.setdefault(prompt, deque())
+            item = pool.popleft() if pool else None
+            remaining = len(pool)
+        if remaining <= self.low_water:
+            self.warm(prompt)
+        if item is None:
+            logger.info(f"Swear prefetch pool empty for '{prompt}', generating inline")
+            item = self._prepare(prompt)
+        # Voice buffers are read by the upload; hand out a fresh one each time.
+        return PreparedMessage(item.text, io.BytesIO(item.voice) if item.voice is not None else None)
+
+    def warm(self, prompt) -> None:
+        with self._lock:
+            if prompt in self._refilling:
+                return
+            self._refilling.add(prompt)
+            generation = self._generations.get(prompt, 0)
+        self._executor.submit(self._refill, prompt, generation)
+
+    def invalidate(self, prompt) -> None:
+        with self._lock:
+            self._pools.pop(prompt, None)
+            self._generations[prompt] = self._generations.get(prompt, 0) + 1
+
+    def _refill(self, prompt, generation):
+        try:
+            while True:
+                with self._lock:
+                    if self._generations.get(prompt, 0) != generation:
+                        return
+                    missing = self.size - len(self._pools.setdefault(prompt, deque()))
+                if missing <= 0:
+                    return
+                if self.generate_batch:
+                    texts = self.generate_batch(prompt, missing)
+                    if not texts:
+                        return
+                    items = [self._prepare(prompt, text) for text in texts]
+                else:
+                    items = [self._prepare(prompt)]
+                with self._lock:
+                    if self._generations.get(prompt, 0) != generation:
+                        return
+                    self._pools.setdefault(prompt, deque()).extend(items)
+        except Exception as e:
+            logger.error(f"Swear prefetch failed for '{prompt}': {e}")
+        finally:
+            with self._lock:
+                self._refilling.discard(prompt)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "prompts": len(self._pools),
+                "ready": sum(len(pool) for pool in self._pools.values()),
+                "refilling": len(self._refilling),
+            }
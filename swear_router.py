@@ -0,0 +1,160 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEDGE_MIN_DELAY = 0.3
+DEFAULT_HEDGE_MAX_DELAY = 5.0
+DEFAULT_WORKERS = 8
+LATENCY_WINDOW = 200
+OUTCOME_WINDOW = 50
+MIN_SAMPLES = 10
+
+
+class BackendStats:
+    """Recent latencies (successful calls) and outcomes of one backend."""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.outcomes = deque(maxlen=OUTCOME_WINDOW)
+        self.calls = 0
+        self.wins = 0
+
+    def record(self, latency, ok):
+        self.calls += 1
+        self.outcomes.append(ok)
+        if ok and latency is not None:
+            self.latencies.append(latency)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def error_rate(self):
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class HedgedSwearRouter:
+    """Routes swear requests across interchangeable generator backends.
+
+    A backend is any object with ``get_answer(question)``; ``backends`` maps a
+    name to it. Each call goes to the backend with the lowest error rate and
+    median latency first. If it has not produced a valid answer after its own
+    p95 latency (clamped to ``hedge_min_delay``..``hedge_max_delay``), or it
+    fails earlier, the same request is sent to the next backend and the first
+    valid answer wins. The losing call cannot be interrupted mid-request; it
+    is cancelled if it has not started and otherwise left to finish in the
+    background with its result discarded (it still feeds the statistics).
+    ``validate`` turns a raw answer into the returned text, or None if the
+    answer is unusable.
+    """
+
+    def __init__(self, backends, validate=None, hedge_min_delay=DEFAULT_HEDGE_MIN_DELAY,
+                 hedge_max_delay=DEFAULT_HEDGE_MAX_DELAY, workers=DEFAULT_WORKERS):
+        if not backends:
+            raise ValueError("HedgedSwearRouter needs at least one backend")
+        self.backends = dict(backends)
+        self.validate = validate or (lambda answer: answer or None)
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_max_delay = hedge_max_delay
+        self._stats = {name: BackendStats() for name in self.backends}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(2, int(workers)), thread_name_prefix="swear-router")
+
+    def _ranked(self):
+        with self._lock:
+            def score(name):
+                stats = self._stats[name]
+                return (round(stats.error_rate(), 1), stats.percentile(0.5) or 0.0)
+            return sorted(self.backends, key=score)
+
+    def _hedge_delay(self, name):
+        with self._lock:
+            stats = self._stats[name]
+            p95 = stats.percentile(0.95) if len(stats.latencies) >= MIN_SAMPLES else None
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(self.hedge_max_delay, max(self.hedge_min_delay, p95))
+
+    def _call(self, name, question):
+        started = time.monotonic()
+        answer = None
+        try:
+            answer = self.validate(self.backends[name].get_answer(question))
+            if answer is None:
+                logger.warning(f"Swear backend {name} returned an unusable answer")
+            return answer
+        except Exception as e:
+            logger.warning(f"Swear backend {name} failed: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._stats[name].record(time.monotonic() - started, answer is not None)
+
+    def get_answer(self, question):
+        ranked = self._ranked()
+        running = {}
+        next_backend = 0
+        deadline = None
+        while True:
+            if next_backend < len(ranked) and (not running or time.monotonic() >= deadline):
+                name = ranked[next_backend]
+                next_backend += 1
+                running[self._executor.submit(contextvars.copy_context().run, self._call, name, question)] = name
+                deadline = time.monotonic() + self._hedge_delay(name)
+                if len(running) > 1:
+                    logger.info(f"Hedging swear request to backend {name}")
+            if not running:
+                raise RuntimeError("All swear backends failed")
+
+            timeout = max(0.0, deadline - time.monotonic()) if next_backend < len(ranked) else None
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                answer = future.result()
+                if answer is not None:
+                    for loser in running:
+                        loser.cancel()
+                    with self._lock:
+                        self._stats[name].wins += 1
+                    return answer
+                # A failed call hedges right away instead of waiting for the delay.
+                deadline = time.monotonic()
+
+    def get_answers(self, question, k):
+        """Batch of swears from the best backend that supports ``get_answers``, else one routed swear."""
+        for name in self._ranked():
+            backend = self.backends[name]
+            if not hasattr(backend, "get_answers"):
+                continue
+            answers = []
+            try:
+                answers = [answer for answer in map(self.validate, backend.get_answers(question, k)) if answer]
+            except Exception as e:
+                logger.warning(f"Swear backend {name} failed on a batch: {e}")
+            finally:
+                with self._lock:
+                    # Batches take longer than single swears; keep them out of the hedge latencies
+                    self._stats[name].record(None, bool(answers))
+            if answers:
+                return answers
+        return [self.get_answer(question)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "calls": stats.calls,
+                    "wins": stats.wins,
+                    "error_rate": stats.error_rate(),
+                    "p50": stats.percentile(0.5),
+                    "p95": stats.percentile(0.95),
+                }
+                for name, stats in self._stats.items()
+            }
@@ -1,6 +1,10 @@
 
-from openai import OpenAI
+import threading
+import time
+from concurrent.futures import Future
 from config import Config
+from http_clients import for_deadline, get_async_openai_client, get_openai_client
+from resilience import breaker, remaining_timeout
 
 SYSTEM_PROMPT = """
 Ты очень весёлый, яркий и язвительный человек.
@@ -12,19 +16,95 @@ SYSTEM_PROMPT = """
 ВАЖНО: Ругательство не должно быть длинее трёх слов.
 """
 
+MAX_SAMPLES_PER_REQUEST = 16
+MAX_SWEAR_WORDS = 6
+MAX_SWEAR_CHARS = 80
+# How long the first caller waits for others asking for the same prompt
+MERGE_WINDOW_SECONDS = 0.05
+
+def clean_swear(text):
+	"""Normalize one sampled answer; returns None if it does not look like a short swear."""
+	lines = (text or "").strip().splitlines()
+	if not lines:
+		return None
+	text = lines[0].strip('"\'«»“”„ ')
+	if not text or len(text) > MAX_SWEAR_CHARS or len(text.split()) > MAX_SWEAR_WORDS:
+		return None
+	return text
+
+
+class _SampleBatch():
+	def __init__(self):
+		self.demand = 0
+		self.future = Future()
+
+
 class SwearingGenerator():
 	def __init__(self):
-		self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+		self.client = get_openai_client()
+		self.async_client = get_async_openai_client()
+		self._batches = {}
+		self._batches_lock = threading.Lock()
 		return
 	
-	def get_answer(self, question):
-		response = self.client.chat.completions.create(
+	def _build_request(self, question, n=1):
+		return dict(
+			n = n,
 			model = "gpt-4.1-nano",
 			messages=[
 				{"role": "system", "content": SYSTEM_PROMPT},
 				{"role": "user", "content": question}
 			],
 			temperature = 1.0,
-			max_tokens = 100
+			max_tokens = 100,
+			timeout = remaining_timeout(Config.LLM_TIMEOUT)
 		)
+
+	def get_answer(self, question):
+		response = breaker("openai").call(for_deadline(self.client).chat.completions.create, **self._build_request(question))
+		return response.choices[0].message.content 
+
+	async def aget_answer(self, question):
+		response = await breaker("openai").acall(for_deadline(self.async_client).chat.completions.create, **self._build_request(question))
 		return response.choices[0].message.content 
+
+	def _sample(self, question, n):
+		response = breaker("openai").call(for_deadline(self.client).chat.completions.create, **self._build_request(question, n))
+		answers = []
+		seen = set()
+		for choice in response.choices:
+			answer = clean_swear(choice.message.content)
+			if answer and answer.lower() not in seen:
+				seen.add(answer.lower())
+				answers.append(answer)
+		return answers
+
+	def get_answers(self, question, k):
+		"""Return up to k distinct swears sampled with a single request (n=k).
+
+		Concurrent calls for the same prompt, e.g. from chats with the same
+		target, are merged: the first caller waits MERGE_WINDOW_SECONDS, sends
+		one request for the combined demand and every caller gets its own slice.
+		Invalid or duplicate samples are dropped, so fewer than k may come back.
+		"""
+		k = max(1, min(int(k), MAX_SAMPLES_PER_REQUEST))
+		with self._batches_lock:
+			batch = self._batches.get(question)
+			leader = batch is None or batch.demand + k > MAX_SAMPLES_PER_REQUEST
+			if leader:
+				batch = self._batches[question] = _SampleBatch()
+			offset = batch.demand
+			batch.demand += k
+
+		if leader:
+			time.sleep(MERGE_WINDOW_SECONDS)
+			with self._batches_lock:
+				if self._batches.get(question) is batch:
+					del self._batches[question]
+				demand = batch.demand
+			try:
+				batch.future.set_result(self._sample(question, demand))
+			except Exception as e:
+				batch.future.set_exception(e)
+
+		return batch.future.result()[offset:offset + k]
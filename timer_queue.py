@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+# Rebuild the heap once cancelled entries make up more than this share of it.
+CANCELLED_COMPACT_RATIO = 0.5
+CANCELLED_COMPACT_MIN = 1024
+
+
+class DispatchStats:
+    """Running numbers on how late timer callbacks started running."""
+
+    __slots__ = ("dispatched", "lag_total", "lag_max", "lag_last")
+
+    def __init__(self):
+        self.dispatched = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self.lag_last = 0.0
+
+    def record(self, lag: float) -> None:
+        self.dispatched += 1
+        self.lag_total += lag
+        self.lag_last = lag
+        if lag > self.lag_max:
+            self.lag_max = lag
+
+    def as_dict(self) -> dict:
+        return {
+            "dispatched": self.dispatched,
+            "lag_last": self.lag_last,
+            "lag_max": self.lag_max,
+            "lag_avg": self.lag_total / self.dispatched if self.dispatched else 0.0,
+        }
+
+
+class TimerHandle:
+    __slots__ = ("due", "seq", "callback", "args", "kwargs", "cancelled", "_queue")
+
+    def __init__(self, queue, due, seq, callback, args, kwargs):
+        self._queue = queue
+        self.due = due
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.due, self.seq) < (other.due, other.seq)
+
+    def cancel(self) -> bool:
+        return self._queue.cancel(self)
+
+
+class TimerQueue:
+    """Delayed actions (deletes, edits, retries) driven by one thread and a min-heap.
+
+    Pending actions are plain heap entries, so 10k pending deletes cost 10k
+    entries instead of 10k ``threading.Timer`` threads. The timer thread sleeps
+    until the earliest due entry and hands due callbacks to a bounded worker
+    pool, so a slow callback never delays the next timer. Cancellation is O(1):
+    the entry is flagged and skipped when it reaches the top of the heap.
+
+    ``stats()`` reports the pending count and dispatch lag, i.e. how long after
+    its due time each callback actually started on a worker.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, name: str = "timer-queue"):
+        self.name = name
+        self._heap: list[TimerHandle] = []
+        self._cancelled = 0
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix=name)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._stopping = False
+        self._stats = DispatchStats()
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._heap) - self._cancelled
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = self._stats.as_dict()
+        stats["pending"] = len(self)
+        return stats
+
+    def call_later(self, delay: float, callback, *args, **kwargs) -> TimerHandle:
+        return self.call_at(time.monotonic() + max(0.0, delay), callback, *args, **kwargs)
+
+    def call_at(self, due: float, callback, *args, **kwargs) -> TimerHandle:
+        """Run ``callback(*args, **kwargs)`` at ``due`` on the ``time.monotonic`` clock."""
+        with self._condition:
+            handle = TimerHandle(self, due, next(self._seq), callback, args, kwargs)
+            heapq.heappush(self._heap, handle)
+            if self._heap[0] is handle:
+                self._condition.notify()
+        return handle
+
+    def cancel(self, handle: TimerHandle) -> bool:
+        with self._condition:
+            if handle.cancelled or handle.callback is None:
+                return False
+            handle.cancelled = True
+            self._cancelled += 1
+            if self._cancelled >= CANCELLED_COMPACT_MIN and self._cancelled > len(self._heap) * CANCELLED_COMPACT_RATIO:
+                self._heap = [entry for entry in self._heap if not entry.cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+        return True
+
+    def _pop_due(self) -> list[TimerHandle]:
+        """Wait until at least one entry is due and pop all due entries. Caller holds the condition."""
+        while not self._stopping:
+            while self._heap and self._heap[0].cancelled:
+                heapq.heappop(self._heap)
+                self._cancelled -= 1
+            if not self._heap:
+                self._condition.wait()
+                continue
+
+            now = time.monotonic()
+            delay = self._heap[0].due - now
+            if delay > 0:
+                self._condition.wait(delay)
+                continue
+
+            due = []
+            while self._heap and self._heap[0].due <= now:
+                handle = heapq.heappop(self._heap)
+                if handle.cancelled:
+                    self._cancelled -= 1
+                    continue
+                due.append(handle)
+            if due:
+                return due
+        return []
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due = self._pop_due()
+                if self._stopping:
+                    return
+                for handle in due:
+                    # Fired handles can no longer be cancelled.
+                    callback, handle.callback = handle.callback, None
+                    handle.cancelled = True
+                    self._submit(handle.due, callback, handle.args, handle.kwargs)
+
+    def _submit(self, due, callback, args, kwargs):
+        try:
+            self._executor.submit(self._invoke, due, callback, args, kwargs)
+        except RuntimeError as e:
+            logger.error(f"{self.name}: unable to run timer callback: {e}")
+
+    def _invoke(self, due, callback, args, kwargs):
+        lag = time.monotonic() - due
+        with self._stats_lock:
+            self._stats.record(lag)
+        try:
+            callback(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"{self.name}: timer callback {getattr(callback, '__name__', callback)} failed: {e}")
+
+    def stop(self, wait: bool = True):
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,137 @@
+import logging
+import math
+import re
+import threading
+from collections import Counter, deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 16
+# Messages (of all chats) the document frequencies are counted over
+DEFAULT_DF_WINDOW = 5000
+DEFAULT_MIN_CONFIDENCE = 0.2
+MIN_MENTIONS = 2
+MIN_WORD_LENGTH = 3
+# Russian words lose their inflection ending and are cut to this many letters, so "выборы"/"выборах" count together
+RUSSIAN_STEM_LENGTH = 6
+MIN_RUSSIAN_STEM = 3
+# Noun and adjective endings, longest first
+_RUSSIAN_ENDINGS = (
+    "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "иях", "ией", "ов", "ев", "ей", "ой", "ий", "ый",
+    "ая", "яя", "ое", "ее", "ые", "ие", "ах", "ях", "ам", "ям", "ом", "ем", "ую", "юю", "ия",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+)
+
+_WORD = re.compile(r"[a-zа-яё]+")
+_CYRILLIC = re.compile(r"[а-яё]")
+
+STOPWORDS = frozenset("""
+the and for are but not you all any can had her was one our out has him his how man new now old see two way who
+its did get got let put say she too use that with have this will your from they know want been good much some time
+very when come here just like long make many more only over such take than them well were what where which while
+would there their about after again also back because before being could does doing down even every first going
+into most other really should still then these those through today under until yeah yes okay lol haha thanks
+что это как так все она они мне меня тебя тебе его ему ещё еще уже только было была были будет быть есть нет
+даже когда если или чтобы потому тоже вот там тут где кто чем что-то какой какая какие который которая которые
+очень просто сейчас теперь можно нужно надо вообще тогда потом пока после через нас вас наш ваш мой твой свой
+себя себе этот эта эти того тот той том при про для без под над между хорошо ладно спасибо привет пожалуйста
+да ну ага угу окей ок ха хаха хахаха
+""".split())
+
+
+def stem(word):
+    """Counting key of a lower-cased word; only Russian words are folded."""
+    if not _CYRILLIC.match(word):
+        return word
+    for ending in _RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_RUSSIAN_STEM:
+            word = word[:-len(ending)]
+            break
+    return word[:RUSSIAN_STEM_LENGTH]
+
+
+def _terms(text):
+    """``(stem, word)`` pairs of the meaningful words of a message."""
+    terms = []
+    for word in _WORD.findall((text or "").lower().replace("ё", "е")):
+        if len(word) < MIN_WORD_LENGTH or word in STOPWORDS:
+            continue
+        terms.append((stem(word), word))
+    return terms
+
+
+class TopicExtractor:
+    """Local keyword topic of each chat's recent messages.
+
+    Every message is a document: the document frequency of each word stem over
+    the last ``df_window`` messages of all chats gives the IDF, so it follows
+    current vocabulary and its size stays bounded. Each chat keeps the stems of its last ``window``
+    messages, updated on ``add`` as messages come and leave, so ``topic`` is
+    cheap. A stem scores (messages mentioning it in the window) x IDF; the
+    topic is the best stem, plus the runner-up when it scores at least half as
+    much, spelled as their most frequent surface forms. Confidence is the
+    share of window messages mentioning the best stem (0 with fewer than two
+    mentions); below ``min_confidence`` ``topic`` returns None and callers
+    fall back to the LLM.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, min_confidence=DEFAULT_MIN_CONFIDENCE, df_window=DEFAULT_DF_WINDOW):
+        self.window = window
+        self.min_confidence = min_confidence
+        self.df_window = max(1, df_window)
+        self._documents = deque()
+        self._df = Counter()
+        self._chats = {}
+        self._lock = threading.Lock()
+
+    def add(self, chat_id, text) -> None:
+        terms = _terms(text)
+        stems = {stem for stem, _ in terms}
+        with self._lock:
+            self._documents.append(stems)
+            self._df.update(stems)
+            if len(self._documents) > self.df_window:
+                for stem in self._documents.popleft():
+                    self._df[stem] -= 1
+                    if self._df[stem] <= 0:
+                        del self._df[stem]
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                chat = self._chats[chat_id] = (deque(), Counter(), Counter())
+            messages, mentions, forms = chat
+            messages.append(terms)
+            mentions.update(stems)
+            forms.update(terms)
+            while len(messages) > self.window:
+                evicted = messages.popleft()
+                mentions.subtract({stem for stem, _ in evicted})
+                forms.subtract(evicted)
+                for key in [key for key, count in mentions.items() if count <= 0]:
+                    del mentions[key]
+                for key in [key for key, count in forms.items() if count <= 0]:
+                    del forms[key]
+
+    def _idf(self, stem):
+        return math.log((1 + len(self._documents)) / (1 + self._df[stem])) + 1
+
+    def _spelling(self, forms, stem):
+        return max((count, word) for (form_stem, word), count in forms.items() if form_stem == stem)[1]
+
+    def topic(self, chat_id):
+        """``(query, confidence)`` for the chat, or ``(None, confidence)`` when it is too unsure."""
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            if not chat or not chat[1]:
+                return None, 0.0
+            messages, mentions, forms = chat
+            scored = sorted(((count * self._idf(stem), stem) for stem, count in mentions.items()), reverse=True)
+            best_score, best = scored[0]
+            if mentions[best] < MIN_MENTIONS:
+                return None, 0.0
+            confidence = mentions[best] / len(messages)
+            if confidence < self.min_confidence:
+                return None, confidence
+            stems = [best]
+            if len(scored) > 1 and scored[1][0] >= best_score / 2 and mentions[scored[1][1]] >= MIN_MENTIONS:
+                stems.append(scored[1][1])
+            return " ".join(self._spelling(forms, stem) for stem in stems), confidence
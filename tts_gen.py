@@ -2,18 +2,20 @@ import inspect
 import io
 import logging
 import re
+import threading
 import time
 import unicodedata
+from concurrent.futures import Future
 from pathlib import Path
 from typing import Any, Callable
 
 import numpy as np
-import soundfile as sf
 import torch
 from num2words import num2words
-from scipy.signal import resample_poly
 
+from audio_post import PAUSE_MS_BETWEEN_CHUNKS, assemble, encode_wav, process_in_place
 from config import Config
+from voice_cache import VoiceCache, file_digest, make_key
 
 logger = logging.getLogger(__name__)
 
@@ -26,10 +28,11 @@ SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?;:])\s+")
 MULTI_SPACE_RE = re.compile(r"\s+")
 
 MAX_CHUNK_CHARS = 220
-PAUSE_MS_BETWEEN_CHUNKS = 140
-TARGET_PEAK = 0.95
-FADE_MS = 8.0
-SOFT_LIMIT = 0.98
+DEFAULT_BATCH_WINDOW_MS = 20
+DEFAULT_BATCH_MAX_CHUNKS = 16
+DEFAULT_NUM_THREADS = 4
+# Silero picks a new voice on every call for this speaker, so its audio is never cached
+UNCACHED_SPEAKERS = frozenset({"random"})
 
 LATIN_TO_CYRILLIC = {
     "a": "а",
@@ -170,51 +173,6 @@ def _chunk_text(text: str, max_chars: int = MAX_CHUNK_CHARS) -> list[str]:
     return [chunk for chunk in chunks if chunk]
 
 
-def _fade_in_out(audio: np.ndarray, sample_rate: int, fade_ms: float = FADE_MS) -> np.ndarray:
-    if audio.size == 0:
-        return audio
-
-    n = audio.shape[0]
-    k = int(sample_rate * fade_ms / 1000.0)
-    if k <= 1 or n < 2 * k:
-        return audio
-
-    window = np.linspace(0.0, 1.0, k, dtype=np.float32)
-    faded = audio.copy()
-    faded[:k] *= window
-    faded[-k:] *= window[::-1]
-    return faded
-
-
-def _remove_dc(audio: np.ndarray) -> np.ndarray:
-    if audio.size == 0:
-        return audio
-    return audio - np.mean(audio, dtype=np.float32)
-
-
-def _peak_normalize(audio: np.ndarray, peak: float = TARGET_PEAK) -> np.ndarray:
-    if audio.size == 0:
-        return audio
-
-    max_abs = float(np.max(np.abs(audio)))
-    if max_abs <= 1e-9:
-        return audio
-
-    return audio * (peak / max_abs)
-
-
-def _soft_limit(audio: np.ndarray, limit: float = SOFT_LIMIT) -> np.ndarray:
-    if audio.size == 0:
-        return audio
-
-    max_abs = float(np.max(np.abs(audio)))
-    if max_abs <= limit:
-        return audio
-
-    clipped = np.clip(audio, -1.0, 1.0)
-    return np.tanh(clipped / limit) * limit
-
-
 def _to_mono_float32(audio: np.ndarray) -> np.ndarray:
     if audio.size == 0:
         return np.asarray(audio, dtype=np.float32)
@@ -228,8 +186,41 @@ def _to_mono_float32(audio: np.ndarray) -> np.ndarray:
     return np.reshape(arr, (-1,)).astype(np.float32, copy=False)
 
 
+def _split_batch_output(generated: Any, count: int) -> list[np.ndarray]:
+    if isinstance(generated, tuple):
+        generated = generated[0]
+    if isinstance(generated, torch.Tensor):
+        generated = generated.detach().cpu()
+        items = list(generated) if generated.dim() > 1 and generated.shape[0] == count else [generated]
+    else:
+        items = list(generated) if isinstance(generated, (list, tuple)) else [generated]
+
+    if len(items) != count:
+        raise RuntimeError(f"apply_tts returned {len(items)} outputs for {count} texts.")
+
+    outputs = []
+    for item in items:
+        if isinstance(item, torch.Tensor):
+            item = item.detach().cpu().numpy()
+        outputs.append(_to_mono_float32(np.squeeze(np.asarray(item))))
+    return outputs
+
+
+class _ChunkBatch:
+    def __init__(self):
+        self.texts: list[str] = []
+        self.future: Future = Future()
+
+
 class TTSGenerator:
-    def __init__(self, sample_rate: int):
+    def __init__(
+        self,
+        sample_rate: int,
+        cache: VoiceCache | None = None,
+        batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        batch_max_chunks: int = DEFAULT_BATCH_MAX_CHUNKS,
+        num_threads: int = DEFAULT_NUM_THREADS,
+    ):
         if sample_rate <= 0:
             raise ValueError("sample_rate must be > 0")
 
@@ -238,7 +229,7 @@ class TTSGenerator:
         self.put_accent = True
         self.put_yo = True
 
-        torch.set_num_threads(4)
+        torch.set_num_threads(max(1, int(num_threads)))
 
         local_file = Config.SILERO_LOCAL_PATH
         if not local_file:
@@ -281,6 +272,11 @@ class TTSGenerator:
 
         self.apply_tts: Callable[..., Any] = self.model.apply_tts
         self.apply_tts_signature = inspect.signature(self.apply_tts)
+        self.supports_batch = "texts" in self.apply_tts_signature.parameters
+        self.batch_window = max(0.0, batch_window_ms / 1000.0)
+        self.batch_max_chunks = max(1, int(batch_max_chunks))
+        self._batches: dict[str, _ChunkBatch] = {}
+        self._batches_lock = threading.Lock()
 
         detected_sr = getattr(self.model, "sample_rate", None) or getattr(
             self.model, "sampling_rate", None
@@ -289,11 +285,15 @@ class TTSGenerator:
 
         self.accentor = _try_load_silero_stress(required=True)
 
+        self.cache = cache
+        self.model_digest = file_digest(self.model_path) if cache is not None else None
+
         logger.info(
-            "TTS initialized with %d voices, model_sr=%d, target_sr=%d",
+            "TTS initialized with %d voices, model_sr=%d, target_sr=%d, batched=%s",
             len(self.speakers),
             self.model_sample_rate,
             self.target_sample_rate,
+            self.supports_batch,
         )
 
     def get_all_voices(self) -> list[str]:
@@ -334,11 +334,16 @@ class TTSGenerator:
 
         return _chunk_text(stressed)
 
-    def _build_apply_kwargs(self, text: str, speaker: str, sample_rate: int) -> dict[str, Any]:
+    def _build_apply_kwargs(
+        self, text: str | None, speaker: str, sample_rate: int, texts: list[str] | None = None
+    ) -> dict[str, Any]:
+        """``apply_tts`` keyword arguments for one ``text``, or for a batch of ``texts``; never both."""
         params = self.apply_tts_signature.parameters
         kwargs: dict[str, Any] = {}
 
-        if "text" in params:
+        if texts is not None:
+            kwargs["texts"] = list(texts)
+        elif "text" in params:
             kwargs["text"] = text
         elif "texts" in params:
             kwargs["texts"] = [text]
@@ -377,20 +382,53 @@ class TTSGenerator:
 
         return _to_mono_float32(np.squeeze(audio))
 
-    def _postprocess_audio(self, audio: np.ndarray, sample_rate: int) -> np.ndarray:
-        processed = _to_mono_float32(audio)
-        processed = _remove_dc(processed)
-        processed = _fade_in_out(processed, sample_rate)
-        processed = _peak_normalize(processed, peak=TARGET_PEAK)
-        processed = _soft_limit(processed, limit=SOFT_LIMIT)
-
-        if sample_rate != self.target_sample_rate:
-            gcd = int(np.gcd(sample_rate, self.target_sample_rate))
-            up = self.target_sample_rate // gcd
-            down = sample_rate // gcd
-            processed = resample_poly(processed, up, down).astype(np.float32)
-
-        return _to_mono_float32(processed)
+    def _synthesize_batch(self, texts: list[str], speaker: str, sample_rate: int) -> list[np.ndarray]:
+        kwargs = self._build_apply_kwargs(text=None, texts=texts, speaker=speaker, sample_rate=sample_rate)
+        with torch.no_grad():
+            generated = self.apply_tts(**kwargs)
+        return _split_batch_output(generated, len(texts))
+
+    def _synthesize_chunks(self, chunks: list[str], speaker: str, sample_rate: int) -> list[np.ndarray]:
+        """Audio of every chunk, synthesized in as few ``apply_tts`` calls as possible.
+
+        Models whose ``apply_tts`` takes ``texts=[...]`` get all chunks of the
+        utterance in one call. Concurrent calls for the same speaker (TTS
+        workers > 1) are merged as well: the first caller waits
+        ``batch_window`` seconds, runs one forward pass for every chunk
+        collected by then (up to ``batch_max_chunks``) and each caller takes
+        its own slice. Other models are called once per chunk.
+        """
+        if not self.supports_batch:
+            return [self._synthesize_chunk(text=chunk, speaker=speaker, sample_rate=sample_rate) for chunk in chunks]
+
+        with self._batches_lock:
+            batch = self._batches.get(speaker)
+            leader = batch is None or len(batch.texts) + len(chunks) > self.batch_max_chunks
+            if leader:
+                batch = self._batches[speaker] = _ChunkBatch()
+            offset = len(batch.texts)
+            batch.texts.extend(chunks)
+
+        if leader:
+            if self.batch_window > 0:
+                time.sleep(self.batch_window)
+            with self._batches_lock:
+                if self._batches.get(speaker) is batch:
+                    del self._batches[speaker]
+                texts = list(batch.texts)
+            try:
+                batch.future.set_result(self._synthesize_batch(texts, speaker, sample_rate))
+            except Exception as exc:
+                batch.future.set_exception(exc)
+            if len(texts) > len(chunks):
+                logger.info("TTS batch speaker=%s merged %d chunks", speaker, len(texts))
+
+        return batch.future.result()[offset:offset + len(chunks)]
+
+    def _cache_key(self, chunks: list[str], speaker: str) -> str | None:
+        if self.cache is None or speaker in UNCACHED_SPEAKERS:
+            return None
+        return make_key(chunks, speaker, self.target_sample_rate, self.model_digest)
 
     def generate_voice(self, text: str, speaker: str) -> io.BytesIO:
         started_at = time.perf_counter()
@@ -398,35 +436,34 @@ class TTSGenerator:
         safe_speaker = self._validate_speaker(speaker)
         chunks = self._prepare_text(text)
 
-        all_parts: list[np.ndarray] = []
-        pause_samples = int(self.model_sample_rate * PAUSE_MS_BETWEEN_CHUNKS / 1000.0)
-        silence = np.zeros(pause_samples, dtype=np.float32)
-
-        for idx, chunk in enumerate(chunks):
-            chunk_audio = self._synthesize_chunk(
-                text=chunk,
-                speaker=safe_speaker,
-                sample_rate=self.model_sample_rate,
-            )
-            all_parts.append(chunk_audio)
-            if idx < len(chunks) - 1 and pause_samples > 0:
-                all_parts.append(silence)
+        cache_key = self._cache_key(chunks, safe_speaker)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info(
+                    "Voice cache hit speaker=%s text_len=%d latency=%.3fs",
+                    safe_speaker,
+                    len(text),
+                    time.perf_counter() - started_at,
+                )
+                return io.BytesIO(cached)
 
-        if not all_parts:
+        pause_samples = int(self.model_sample_rate * PAUSE_MS_BETWEEN_CHUNKS / 1000.0)
+        chunk_audios = self._synthesize_chunks(chunks, safe_speaker, self.model_sample_rate)
+        if not chunk_audios:
             raise RuntimeError("No audio chunks were synthesized.")
 
-        raw_audio = np.concatenate(all_parts).astype(np.float32, copy=False)
-        processed_audio = self._postprocess_audio(raw_audio, self.model_sample_rate)
-
-        peak_after = float(np.max(np.abs(processed_audio))) if processed_audio.size else 0.0
+        processed_audio, peak_after = process_in_place(
+            assemble(chunk_audios, pause_samples),
+            self.model_sample_rate,
+            self.target_sample_rate,
+        )
         duration_s = processed_audio.size / float(self.target_sample_rate)
 
-        wav = np.clip(processed_audio, -1.0, 1.0)
-        wav_i16 = (wav * 32767.0).astype(np.int16)
+        buffer = encode_wav(processed_audio, self.target_sample_rate, peak_after)
 
-        buffer = io.BytesIO()
-        sf.write(buffer, wav_i16, self.target_sample_rate, format="WAV", subtype="PCM_16")
-        buffer.seek(0)
+        if cache_key is not None:
+            self.cache.put(cache_key, buffer.getvalue())
 
         logger.info(
             "Voice generated speaker=%s chunks=%d text_len=%d duration=%.2fs peak=%.4f latency=%.2fs",
@@ -440,8 +477,29 @@ class TTSGenerator:
 
         return buffer
 
+    def prewarm(self, phrases: list[str], speakers: list[str] | None = None) -> int:
+        """Synthesize uncached phrases for every speaker into the cache; returns how many were generated."""
+        if self.cache is None:
+            return 0
+
+        generated = 0
+        for speaker in speakers or self.speakers:
+            if speaker in UNCACHED_SPEAKERS:
+                continue
+            for phrase in phrases:
+                try:
+                    cache_key = self._cache_key(self._prepare_text(phrase), speaker)
+                    if cache_key not in self.cache:
+                        self.generate_voice(text=phrase, speaker=speaker)
+                        generated += 1
+                except Exception as exc:
+                    logger.warning("Voice prewarm failed speaker=%s phrase=%r: %s", speaker, phrase, exc)
+
+        logger.info("Voice cache prewarmed: %d phrases generated", generated)
+        return generated
+
     def generate_voice_to_file(self, text: str, speaker: str, output_file: str) -> str:
         buffer = self.generate_voice(text=text, speaker=speaker)
         with open(output_file, "wb") as handle:
-            handle.write(buffer.getvalue())
+            handle.write(buffer.getbuffer())
         return output_file
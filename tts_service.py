@@ -0,0 +1,229 @@
+"""Silero TTS in separate worker processes.
+
+``TTSWorkerPool`` starts ``processes`` copies of this script. Each loads the
+model once (``TTS_TORCH_THREADS`` intra-op threads) and answers requests read
+from its stdin with encoded WAV bytes written to its stdout, both as pickled
+tuples. Busy workers are taken from a queue, so inference runs outside the
+bot's interpreter and scales with the number of processes, and voice
+synthesis never holds the GIL of the Telegram handlers. Workers share the
+on-disk voice cache when ``VOICE_CACHE_DIR`` is set; each keeps its own
+memory tier. A worker whose pipe breaks, or that does not answer within
+``TTS_REQUEST_TIMEOUT_SECONDS``, is killed and replaced by a fresh process.
+"""
+import io
+import logging
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+WORKER_SCRIPT = Path(__file__).resolve()
+SHUTDOWN_TIMEOUT = 5
+
+
+class _Worker:
+    def __init__(self, sample_rate):
+        self.process = subprocess.Popen(
+            [sys.executable, str(WORKER_SCRIPT), str(sample_rate)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            cwd=str(WORKER_SCRIPT.parent),
+        )
+        self.speakers = None
+
+    def _read(self):
+        return pickle.load(self.process.stdout)
+
+    def wait_ready(self):
+        """Block until the model is loaded; returns the worker's speakers."""
+        if self.speakers is None:
+            status, speakers = self._read()
+            if status != "ready":
+                raise RuntimeError(f"Unexpected message from TTS worker: {status}")
+            self.speakers = speakers
+        return self.speakers
+
+    def request(self, *request, timeout=None):
+        """Send one request and wait for its answer.
+
+        A worker that does not answer within ``timeout`` seconds is killed,
+        which ends the blocked read, and ``TimeoutError`` is raised.
+        """
+        self.wait_ready()
+        expired = threading.Event()
+        watchdog = None
+        if timeout:
+            watchdog = threading.Timer(timeout, lambda: (expired.set(), self.kill()))
+            watchdog.daemon = True
+            watchdog.start()
+        try:
+            pickle.dump(request, self.process.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+            self.process.stdin.flush()
+            status, result = self._read()
+        except (EOFError, OSError, pickle.UnpicklingError):
+            if expired.is_set():
+                raise TimeoutError(f"TTS worker {self.process.pid} did not answer within {timeout:g}s")
+            raise
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+        if expired.is_set():
+            # Answered just as the watchdog fired: the result is fine, the process is gone
+            raise TimeoutError(f"TTS worker {self.process.pid} was killed after {timeout:g}s")
+        if status == "error":
+            raise RuntimeError(result)
+        return result
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.wait(timeout=SHUTDOWN_TIMEOUT)
+        except Exception:
+            pass
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=SHUTDOWN_TIMEOUT)
+        except Exception:
+            self.kill()
+
+
+class TTSWorkerPool:
+    """Drop-in replacement for ``TTSGenerator`` backed by worker processes."""
+
+    def __init__(self, processes, sample_rate, request_timeout=None):
+        self.sample_rate = int(sample_rate)
+        self.request_timeout = Config.TTS_REQUEST_TIMEOUT_SECONDS if request_timeout is None else request_timeout
+        workers = [_Worker(self.sample_rate) for _ in range(max(1, int(processes)))]
+        try:
+            # Workers load the model in parallel; wait for all of them
+            for worker in workers:
+                worker.wait_ready()
+        except (EOFError, OSError, pickle.UnpicklingError) as e:
+            for worker in workers:
+                worker.kill()
+            raise RuntimeError(f"TTS worker failed to start: {e}") from e
+
+        self.speakers = list(workers[0].speakers)
+        self.processes = len(workers)
+        self._idle = queue.Queue()
+        for worker in workers:
+            self._idle.put(worker)
+        self._workers = set(workers)
+        self._closed = False
+        self._lock = threading.Lock()
+        self.busy = 0
+        self.requests = 0
+        self.restarts = 0
+        logger.info(f"TTS worker pool started: {self.processes} processes, {Config.TTS_TORCH_THREADS} torch threads each")
+
+    def _call(self, *request):
+        worker = self._idle.get()
+        with self._lock:
+            self.busy += 1
+            self.requests += 1
+        try:
+            return worker.request(*request, timeout=self.request_timeout)
+        except (EOFError, OSError, ValueError, pickle.UnpicklingError) as e:
+            # TimeoutError is an OSError; ValueError means close() shut the pipe under us
+            worker.kill()
+            with self._lock:
+                self._workers.discard(worker)
+                closed = self._closed
+            if closed:
+                raise RuntimeError("TTS worker pool is closed") from e
+            logger.error(f"TTS worker {worker.process.pid} failed ({e!r}); starting a new one")
+            worker = _Worker(self.sample_rate)
+            with self._lock:
+                self._workers.add(worker)
+                self.restarts += 1
+            raise RuntimeError(f"TTS worker failed: {e!r}") from e
+        finally:
+            with self._lock:
+                self.busy -= 1
+            self._idle.put(worker)
+
+    def get_all_voices(self) -> list[str]:
+        return list(self.speakers)
+
+    def generate_voice(self, text: str, speaker: str) -> io.BytesIO:
+        return io.BytesIO(self._call("voice", text, speaker))
+
+    def prewarm(self, phrases: list[str], speakers: list[str] | None = None) -> int:
+        return self._call("prewarm", list(phrases), speakers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "processes": self.processes,
+                "busy": self.busy,
+                "requests": self.requests,
+                "restarts": self.restarts,
+            }
+
+    def close(self) -> None:
+        """Stop every worker, busy ones included; a request in flight gets SHUTDOWN_TIMEOUT to finish."""
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+        for worker in workers:
+            worker.close()
+
+
+def _send(output, message):
+    pickle.dump(message, output, protocol=pickle.HIGHEST_PROTOCOL)
+    output.flush()
+
+
+def serve(sample_rate):
+    """Worker loop: load the model, then answer requests until stdin closes."""
+    # Keep the real stdout for the protocol; anything printed goes to stderr
+    output = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    requests = sys.stdin.buffer
+
+    from tts_gen import TTSGenerator
+    from voice_cache import VoiceCache
+
+    generator = TTSGenerator(
+        sample_rate,
+        cache=VoiceCache(Config.VOICE_CACHE_SIZE, Config.VOICE_CACHE_DIR, int(Config.VOICE_CACHE_MAX_MB * 1024 * 1024)),
+        num_threads=Config.TTS_TORCH_THREADS,
+        # Requests are served one at a time, so there is never a concurrent synthesis to wait for
+        batch_window_ms=0,
+        batch_max_chunks=Config.TTS_BATCH_MAX_CHUNKS,
+    )
+    _send(output, ("ready", generator.get_all_voices()))
+
+    while True:
+        try:
+            request = pickle.load(requests)
+        except EOFError:
+            return
+        kind, args = request[0], request[1:]
+        try:
+            if kind == "voice":
+                result = generator.generate_voice(*args).getvalue()
+            elif kind == "prewarm":
+                result = generator.prewarm(*args)
+            else:
+                raise ValueError(f"Unknown TTS request {kind!r}")
+        except Exception as e:
+            _send(output, ("error", f"{type(e).__name__}: {e}"))
+            continue
+        _send(output, ("ok", result))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - tts-worker %(process)d - %(levelname)s - %(message)s')
+    serve(int(sys.argv[1]))
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_ENTRIES = 128
+DEFAULT_DISK_MAX_BYTES = 200 * 1024 * 1024
+FILE_SUFFIX = ".wav"
+
+
+def file_digest(path, block_size=1024 * 1024) -> str:
+    """SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_key(chunks, speaker, sample_rate, model_digest) -> str:
+    """Cache key of one utterance: prepared text chunks, speaker, output rate and model file."""
+    payload = json.dumps([list(chunks), speaker, int(sample_rate), model_digest], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class VoiceCache:
+    """Two-tier cache of encoded voice messages (WAV bytes).
+
+    The memory tier is an LRU of ``memory_entries`` items. When ``directory``
+    is set, entries are also written there as ``<key>.wav`` files, at most
+    ``disk_max_bytes`` in total; the least recently used files are deleted
+    first (file mtime is the recency, so it survives a restart). A disk hit
+    is promoted to the memory tier. Several processes may share a directory:
+    a file written by another process is picked up on lookup, and each
+    process enforces the size cap over the files it knows about.
+    """
+
+    def __init__(self, memory_entries=DEFAULT_MEMORY_ENTRIES, directory=None, disk_max_bytes=DEFAULT_DISK_MAX_BYTES):
+        self.memory_entries = max(1, int(memory_entries))
+        self.directory = Path(directory) if directory else None
+        self.disk_max_bytes = int(disk_max_bytes)
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.directory:
+            self._scan()
+
+    def _scan(self):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.directory.glob(f"*{FILE_SUFFIX}"), key=lambda item: item.stat().st_mtime)
+            for item in files:
+                size = item.stat().st_size
+                self._disk[item.stem] = size
+                self._disk_bytes += size
+        except OSError as e:
+            logger.warning(f"Unable to read voice cache directory {self.directory}: {e}")
+            self.directory = None
+            return
+        self._evict_disk()
+        logger.info(f"Voice cache: {len(self._disk)} files ({self._disk_bytes / 1e6:.1f} MB) in {self.directory}")
+
+    def _path(self, key):
+        return self.directory / f"{key}{FILE_SUFFIX}"
+
+    def _remember(self, key, data):
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        while self._disk and self._disk_bytes > self.disk_max_bytes:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Unable to evict cached voice {key}: {e}")
+
+    def _forget_disk(self, key):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get(self, key):
+        """Cached WAV bytes for ``key``, or None on a miss."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                self.memory_hits += 1
+                return data
+
+        if self.directory:
+            path = self._path(key)
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                data = None
+            with self._lock:
+                if data is None:
+                    self._forget_disk(key)
+                else:
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    else:
+                        self._disk[key] = len(data)
+                        self._disk_bytes += len(data)
+                    self._remember(key, data)
+                    self.disk_hits += 1
+                    return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data) -> None:
+        if not data:
+            return
+        with self._lock:
+            self._remember(key, data)
+            if not self.directory or key in self._disk or len(data) > self.disk_max_bytes:
+                return
+
+        path = self._path(key)
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Unable to write cached voice {key}: {e}")
+            return
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+            self._evict_disk()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+            }
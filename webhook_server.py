@@ -0,0 +1,121 @@
+import json
+import logging
+import queue
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot.types import Update
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 256
+MAX_BODY_BYTES = 4 * 1024 * 1024
+RETRY_AFTER_SECONDS = 5
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """Embedded HTTP server that feeds webhook updates to a ``TeleBot``.
+
+    A POST body may hold one update (as Telegram sends it) or a JSON list of
+    updates, which makes replaying recorded updates locally easy. Updates go
+    into a bounded queue served by ``workers`` threads that call
+    ``bot.process_new_updates``, so the regular ``@bot.message_handler``
+    functions run unchanged. When the queue cannot take the whole batch the
+    server answers 503 with ``Retry-After`` and Telegram redelivers later.
+    """
+
+    def __init__(self, bot, listen="0.0.0.0", port=8443, path="/telegram", secret_token=None,
+                 workers=DEFAULT_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        self.bot = bot
+        self.path = path
+        self.secret_token = secret_token or None
+        self.updates = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._enqueue_lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"webhook-worker-{index}", daemon=True)
+            for index in range(max(1, int(workers)))
+        ]
+        self.httpd = ThreadingHTTPServer((listen, int(port)), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                server._handle_post(self)
+
+            def log_message(self, format, *args):
+                logger.debug("webhook %s - %s", self.address_string(), format % args)
+
+        return Handler
+
+    def _respond(self, request, status, headers=None):
+        request.send_response(status)
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.send_header("Content-Length", "0")
+        request.end_headers()
+
+    def _handle_post(self, request):
+        if request.path.split("?", 1)[0] != self.path:
+            self._respond(request, HTTPStatus.NOT_FOUND)
+            return
+        if self.secret_token and request.headers.get(SECRET_HEADER) != self.secret_token:
+            self._respond(request, HTTPStatus.FORBIDDEN)
+            return
+
+        try:
+            length = int(request.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._respond(request, HTTPStatus.BAD_REQUEST)
+            return
+
+        try:
+            payload = json.loads(request.rfile.read(length).decode("utf-8"))
+            batch = payload if isinstance(payload, list) else [payload]
+            updates = [Update.de_json(item) for item in batch]
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Rejected malformed webhook payload: {e}")
+            self._respond(request, HTTPStatus.BAD_REQUEST)
+            return
+
+        if not self._enqueue(updates):
+            logger.warning(f"Webhook queue full, asking Telegram to retry {len(updates)} update(s)")
+            self._respond(request, HTTPStatus.SERVICE_UNAVAILABLE, {"Retry-After": str(RETRY_AFTER_SECONDS)})
+            return
+        self._respond(request, HTTPStatus.OK)
+
+    def _enqueue(self, updates) -> bool:
+        # All-or-nothing, so a retried batch is never half processed already.
+        with self._enqueue_lock:
+            if self.updates.maxsize - self.updates.qsize() < len(updates):
+                return False
+            for update in updates:
+                self.updates.put_nowait(update)
+        return True
+
+    def _work(self):
+        while True:
+            update = self.updates.get()
+            try:
+                self.bot.process_new_updates([update])
+            except Exception as e:
+                logger.error(f"Unexpected error while processing update {getattr(update, 'update_id', '?')}: {e}")
+            finally:
+                self.updates.task_done()
+
+    def serve_forever(self):
+        for worker in self._workers:
+            worker.start()
+        host, port = self.httpd.server_address[:2]
+        logger.info(f"Webhook server listening on {host}:{port}{self.path}")
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        self.httpd.shutdown()